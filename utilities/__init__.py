@@ -1,12 +1,19 @@
-__all__ = ['dols', 'strip', 'popd', 'pushd', 'readImage', 'writeImage',
-           'readLLtoRA', 'writeLLtoRAformat', 'myerror', 'runMyThreads',
-           'mywarning', 'myalert', 'hsvVelCmap', 'getWKT_PROJ', 'myPrompt',
-           'callMyProg', 'logger', 'processProfile', 'runvel', 'geoimage',
-           'geodat', 'geodatrxa', 'writeLLtoRAformat', 'readLLtoRA',
-           'offsets', 'lsdat', 'lsfit', 'makeMaskFromShape', 'getWKT_PROJ',
-           'shpplot']
+__all__ = ['dols', 'strip', 'popd', 'pushd', 'readImage', 'nativeBlock',
+           'writeImage', 'readLLtoRA', 'writeLLtoRAformat', 'myerror',
+           'runMyThreads', 'mywarning', 'myalert', 'hsvVelCmap', 'getWKT_PROJ',
+           'myPrompt', 'callMyProg', 'logger', 'processProfile', 'runvel',
+           'geoimage', 'geodat', 'geodatrxa', 'writeLLtoRAformat',
+           'readLLtoRA', 'offsets', 'lsdat', 'lsfit', 'makeMaskFromShape',
+           'getWKT_PROJ', 'shpplot', 'floatPrecision', 'setFloatPrecision',
+           'getFloatType', 'asFloat', 'benchmarkTiffProfiles', 'mosaicker',
+           'getTransformer', 'getProj', 'getCRS', 'clearProjCache',
+           'setProjCacheSize']
 from utilities.dols import dols
+from utilities.floatPrecision import floatPrecision, setFloatPrecision, \
+    getFloatType, asFloat
 from utilities.myerror import myerror
+from utilities.projCache import getTransformer, getProj, getCRS, \
+    clearProjCache, setProjCacheSize
 from utilities.strip import strip
 from utilities.pushdpopd import pushd
 from utilities.pushdpopd import popd
@@ -15,7 +22,7 @@ from utilities.geodat import geodat
 from utilities.geoimage import geoimage
 from utilities.geodatrxa import geodatrxa
 from utilities.offsets import offsets
-from utilities.readImage import readImage
+from utilities.readImage import readImage, nativeBlock
 from utilities.writeImage import writeImage
 from utilities.readwriteLLtoRA import writeLLtoRAformat, readLLtoRA
 from utilities.runMyThreads import runMyThreads
@@ -31,3 +38,5 @@ from utilities.myPrompt import myPrompt
 from utilities.callMyProg import callMyProg
 from utilities.logger import logger
 from utilities.processProfile import processProfile
+from utilities.benchmarkTiffProfiles import benchmarkTiffProfiles
+from utilities.mosaicker import mosaicker
@@ -0,0 +1,100 @@
+# benchmarkTiffProfiles.py
+import argparse
+import glob
+import os
+import time
+import numpy as np
+from utilities.geoimage import geoimage, tiffProfiles
+from utilities.geodat import geodat
+
+
+def syntheticVelocity(nx=4000, ny=4000, dx=200.):
+    ''' Make a velocity geoimage with smooth flow, noise and nodata to stand
+    in for a mosaic '''
+    myImage = geoimage(geoType='velocity', verbose=False)
+    myImage.geo = geodat(x0=-500., y0=-2500., xs=nx, ys=ny, dx=dx, dy=dx,
+                         verbose=False)
+    myImage.xyCoordinates()
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 6 * np.pi, nx, dtype=np.float32)
+    y = np.linspace(0, 6 * np.pi, ny, dtype=np.float32)[:, np.newaxis]
+    speed = 50. * np.exp(2 * np.sin(x / 3) * np.cos(y / 2))
+    noise = rng.normal(0, 2, (2, ny, nx)).astype(np.float32)
+    myImage.vx = (speed * np.cos(x + y) + noise[0]).astype(np.float32)
+    myImage.vy = (speed * np.sin(x - y) + noise[1]).astype(np.float32)
+    # ocean/nodata
+    myImage.vx[:, 0:nx // 5] = np.nan
+    myImage.vy[:, 0:nx // 5] = np.nan
+    myImage.v = np.hypot(myImage.vx, myImage.vy)
+    return myImage
+
+
+def benchmarkTiffProfiles(myImage, outDir='.', profiles=None,
+                          driverName='COG', keep=False):
+    ''' Write myImage with each output profile and read it back. Returns
+    {profile: (write time s, read time s, size MB)} '''
+    if profiles is None:
+        profiles = list(tiffProfiles)
+    results = {}
+    for profile in profiles:
+        fileRoot = os.path.join(outDir, f'benchmark.{profile}')
+        start = time.perf_counter()
+        myImage.writeMyTiff(fileRoot, profile=profile, driverName=driverName)
+        writeTime = time.perf_counter() - start
+        #
+        start = time.perf_counter()
+        readBack = geoimage(verbose=False)
+        readBack.readData(fileRoot, geoType=myImage.geoType, tiff=True)
+        readTime = time.perf_counter() - start
+        #
+        files = glob.glob(f'{fileRoot}*.tif')
+        size = sum(os.path.getsize(x) for x in files) / 1e6
+        results[profile] = (writeTime, readTime, size)
+        if not keep:
+            for x in files:
+                os.remove(x)
+    return results
+
+
+def main():
+    ''' Benchmark write time, read time and file size for the geoimage
+    output profiles '''
+    parser = argparse.ArgumentParser(
+        description='Write a geoimage with each output profile and report '
+        'write time, read time and file size. Uses a synthetic velocity '
+        'mosaic unless fileName is given')
+    parser.add_argument('fileName', nargs='?', default=None,
+                        help='geoimage to use (base name for velocity)')
+    parser.add_argument('--geoType', default='velocity',
+                        choices=['scalar', 'velocity', 'error'])
+    parser.add_argument('--tiff', action='store_true',
+                        help='fileName is a tiff product')
+    parser.add_argument('--size', type=int, default=4000,
+                        help='size of synthetic image [4000]')
+    parser.add_argument('--outDir', default='.',
+                        help='directory for test files [.]')
+    parser.add_argument('--profiles', nargs='+', default=None,
+                        choices=list(tiffProfiles),
+                        help='profiles to test [all]')
+    parser.add_argument('--driver', default='COG', choices=['COG', 'GTiff'])
+    parser.add_argument('--keep', action='store_true',
+                        help='keep the test files')
+    args = parser.parse_args()
+    #
+    if args.fileName is not None:
+        myImage = geoimage(verbose=False)
+        myImage.readData(args.fileName, geoType=args.geoType, tiff=args.tiff)
+    else:
+        myImage = syntheticVelocity(nx=args.size, ny=args.size)
+    results = benchmarkTiffProfiles(myImage, outDir=args.outDir,
+                                    profiles=args.profiles,
+                                    driverName=args.driver, keep=args.keep)
+    print(f'{"profile":16s} {"write (s)":>10s} {"read (s)":>10s} '
+          f'{"size (MB)":>10s}')
+    for profile, (writeTime, readTime, size) in results.items():
+        print(f'{profile:16s} {writeTime:10.2f} {readTime:10.2f} '
+              f'{size:10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# floatPrecision.py
+import numpy as np
+from contextlib import contextmanager
+from utilities.myerror import myerror
+
+# Package wide precision for data arrays (offsets, velocities, projected
+# coordinates). float64 keeps the original behaviour.
+precision = {'dtype': np.float64}
+
+
+def setFloatPrecision(dtype):
+    """ set package precision for data arrays to 'float32' or 'float64' """
+    dtype = np.dtype(dtype)
+    if dtype not in [np.float32, np.float64]:
+        myerror(f'setFloatPrecision: invalid dtype {dtype}, use float32 or '
+                'float64')
+    precision['dtype'] = dtype.type
+
+
+def getFloatType():
+    """ return the current package float type """
+    return precision['dtype']
+
+
+@contextmanager
+def floatPrecision(dtype):
+    """ temporarily set the package precision, e.g.,
+    with floatPrecision('float32'):
+        rg, az = myOffsets.getOffsets()
+    """
+    saved = getFloatType()
+    setFloatPrecision(dtype)
+    try:
+        yield
+    finally:
+        setFloatPrecision(saved)
+
+
+def asFloat(x):
+    """ return x as the package float type - x itself (no copy) if it is
+    already that type """
+    return np.asarray(x).astype(getFloatType(), copy=False)
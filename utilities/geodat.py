@@ -1,8 +1,11 @@
 # geodat.py
 import numpy as np
-import pyproj
 from osgeo import gdal
 from utilities import myerror
+from utilities.floatPrecision import getFloatType
+from utilities.projCache import getProj, getTransformer
+from concurrent.futures import ThreadPoolExecutor
+from scipy.interpolate import make_interp_spline
 import re
 
 
@@ -41,10 +44,10 @@ class geodat:
                 myerror(f'\n--- setup geodat invalid domain {self.domain} not'
                         f' in {domains}')
         #
-        # setup conversions
+        # setup conversions - projections and transformers are looked up in
+        # the per thread projCache on use (see __getattr__)
         #
         self.llprojEPSG = "EPSG:4326"
-        self.llproj = pyproj.Proj(self.llprojEPSG)  # Obsolete
         if wkt is not None:
             #self.domain = re.findall('[a-z,A-Z]+', wkt)[1].lower()
             self.xyprojSRS = wkt  # This could be a wkt or epsg
@@ -53,49 +56,191 @@ class geodat:
                 self.xyprojSRS = "EPSG:3413"
             elif self.domain == 'antarctica':
                 self.xyprojSRS = "EPSG:3031"
-        self.xyproj = pyproj.Proj(self.xyprojSRS)
-        self.lltoxyXform = pyproj.Transformer.from_crs(self.llprojEPSG,
-                                                       self.xyprojSRS)
-        self.xytollXform = pyproj.Transformer.from_crs(self.xyprojSRS,
-                                                       self.llprojEPSG)
         if self.verbose:
             print('setting up projections', self.domain)
 
-    def lltoxym(self, lat, lon, scale=None):
+    def __getattr__(self, name):
+        """ llproj (obsolete), xyproj, lltoxyXform and xytollXform come from
+        the projCache, so they are created once per thread and process """
+        srs = {'llproj': 'llprojEPSG', 'xyproj': 'xyprojSRS'}
+        xforms = {'lltoxyXform': ('llprojEPSG', 'xyprojSRS'),
+                  'xytollXform': ('xyprojSRS', 'llprojEPSG')}
+        if name in srs and srs[name] in self.__dict__:
+            return getProj(self.__dict__[srs[name]])
+        if name in xforms and all(x in self.__dict__ for x in xforms[name]):
+            return getTransformer(*[self.__dict__[x] for x in xforms[name]])
+        raise AttributeError(f"'geodat' object has no attribute '{name}'")
+
+    def lltoxym(self, lat, lon, scale=None, out=None, chunkSize=None,
+                nThreads=1, tolerance=None):
         """ lat, lon is an nparray of xy points in units of km, output is x, y
-        in meters """
+        in meters. The transform is float64, output is package precision.
+        out=(x, y) writes into caller arrays (which may be lat, lon for an
+        in place transform). See transformPoints for chunkSize/nThreads and
+        tolerance (m) for approximate transforms of smooth 2D grids """
         if scale is None:
             scale = 1
-        sh = lat.shape
-        lat1 = lat.flatten()
-        lon1 = lon.flatten()
-        x, y = self.lltoxyXform.transform(lat1, lon1)
-        x = scale * x.reshape(sh)
-        y = scale * y.reshape(sh)
-        return x, y
+        return self.transformPoints((self.llprojEPSG, self.xyprojSRS), lat,
+                                    lon, 1, scale, out, getFloatType(),
+                                    chunkSize, nThreads, tolerance)
 
     def lltoImage(self, lat, lon, scale=None):
         x, y = self.lltoxym(lat, lon)
         return self.xymtoImage(x, y)
 
-    def lltoxykm(self, lat, lon):
+    def lltoxykm(self, lat, lon, **kwargs):
         """ lat, lon is an nparray of xy points in units of km,  output is x,
         y in KILOmeters """
-        return self.lltoxym(lat, lon, scale=0.001)
+        return self.lltoxym(lat, lon, scale=0.001, **kwargs)
 
-    def xymtoll(self, x, y, scale=None):
+    def xymtoll(self, x, y, scale=None, out=None, chunkSize=None,
+                nThreads=1, tolerance=None):
         """ x, y  is an nparray of points in PS meters, output lat,lon in
-        similar array """
+        similar array. out=(lat, lon) writes into caller arrays (which may
+        be x, y). See transformPoints for chunkSize/nThreads and tolerance
+        (m) for approximate transforms of smooth 2D grids """
         if scale is None:
             scale = 1
-        sh = x.shape
-        xx = x.flatten()
-        yy = y.flatten()
+        return self.transformPoints((self.xyprojSRS, self.llprojEPSG), x, y,
+                                    scale, 1, out, np.float64, chunkSize,
+                                    nThreads, tolerance)
+
+    def transformPoints(self, srs, a, b, inScale, outScale, out, outType,
+                        chunkSize=None, nThreads=1, tolerance=None):
+        """ transform points a, b between srs=(from, to) in chunks of
+        chunkSize [1M] points on nThreads threads, each with its own
+        transformer. Scaling is applied as each chunk is copied in and out,
+        and float64 outputs are transformed in place, so the only temporary
+        arrays are per chunk. Returns out (new arrays of outType if None).
+        If a, b are 2D grids and tolerance (m) is given, use approxTransform
+        """
+        a, b = np.asarray(a), np.asarray(b)
+        if out is None:
+            out = (np.empty(a.shape, dtype=outType),
+                   np.empty(a.shape, dtype=outType))
+        if b.shape != a.shape or \
+                any(x.shape != a.shape or not x.flags.c_contiguous
+                    for x in out):
+            myerror('geodat.transformPoints: inputs and out should match in '
+                    'shape and out should be contiguous')
+        if tolerance is not None and a.ndim == 2:
+            self.approxTransform(srs, a, b, inScale, outScale, out,
+                                 tolerance, nThreads=nThreads)
+            return out[0], out[1]
+        if chunkSize is None:
+            chunkSize = 1 << 20
+        a1, b1 = a.reshape(-1), b.reshape(-1)
+        out1 = [x.reshape(-1) for x in out]
 
-        lat, lon = self.xytollXform.transform(xx * scale, yy * scale)
-        lat = lat.reshape(sh)
-        lon = lon.reshape(sh)
-        return lat, lon
+        def transformChunk(i):
+            j = slice(i, i + chunkSize)
+            # transform in the output if float64, else in a scratch chunk
+            inOut = [x.dtype == np.float64 for x in out1]
+            buffers = [x[j] if y else np.empty(x[j].size, dtype=np.float64)
+                       for x, y in zip(out1, inOut)]
+            for buf, inPart in zip(buffers, (a1[j], b1[j])):
+                np.multiply(inPart, inScale, out=buf)
+            getTransformer(*srs).transform(*buffers, inplace=True)
+            for buf, outPart, y in zip(buffers, out1, inOut):
+                if outScale != 1 or not y:
+                    np.multiply(buf, outScale, out=outPart[j],
+                                casting='same_kind')
+        #
+        chunks = range(0, a1.size, chunkSize)
+        if nThreads > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=nThreads) as pool:
+                list(pool.map(transformChunk, chunks))
+        else:
+            for i in chunks:
+                transformChunk(i)
+        return out[0], out[1]
+
+    def approxTransform(self, srs, a, b, inScale, outScale, out, tolerance,
+                        nThreads=1, blockSize=256, step=64, margin=0.5):
+        """ approximate transform of smooth 2D grids a, b into out. Each
+        blockSize x blockSize block is interpolated (bicubic spline) from
+        exact transforms on a control grid with spacing step, which is halved
+        until the interpolation error at the 1/4, 1/2 and 3/4 points of each
+        control cell is less than margin * tolerance (m), since the error
+        can peak between the check points. Blocks that never meet it are
+        transformed exactly (e.g., across the dateline) """
+        ny, nx = a.shape
+        geographic = srs[1] == self.llprojEPSG
+
+        def exact(rows, cols):
+            xform = getTransformer(*srs)
+            index = np.ix_(rows, cols)
+            return xform.transform(a[index] * inScale, b[index] * inScale)
+
+        def transformBlock(block):
+            r0, c0 = block
+            rows = np.arange(r0, min(r0 + blockSize, ny))
+            cols = np.arange(c0, min(c0 + blockSize, nx))
+            result = None
+            mySteps = [step // 2**i for i in range(int(np.log2(step)))]
+            for myStep in mySteps if min(rows.size, cols.size) > 2 else []:
+                # control grid, which always includes the block edges
+                cRows = np.append(rows[0:-1:myStep], rows[-1])
+                cCols = np.append(cols[0:-1:myStep], cols[-1])
+                control = exact(cRows, cCols)
+                # check points at 1/4, 1/2 and 3/4 of each control cell
+                mRows, mCols = self.checkPoints(cRows), self.checkPoints(cCols)
+                error = self.approxError(
+                    exact(mRows, mCols),
+                    self.controlInterp(control, cRows, cCols, mRows, mCols),
+                    geographic)
+                if error <= tolerance * margin:
+                    result = self.controlInterp(control, cRows, cCols, rows,
+                                                cols)
+                    break
+            if result is None:
+                result = exact(rows, cols)
+            region = (slice(rows[0], rows[-1] + 1),
+                      slice(cols[0], cols[-1] + 1))
+            for x, y in zip(out, result):
+                np.multiply(y, outScale, out=x[region], casting='same_kind')
+        #
+        blocks = [(r0, c0) for r0 in range(0, ny, blockSize)
+                  for c0 in range(0, nx, blockSize)]
+        if nThreads > 1 and len(blocks) > 1:
+            with ThreadPoolExecutor(max_workers=nThreads) as pool:
+                list(pool.map(transformBlock, blocks))
+        else:
+            for block in blocks:
+                transformBlock(block)
+
+    def checkPoints(self, cIndex):
+        """ unique indices at 1/4, 1/2 and 3/4 of each control interval """
+        d = np.diff(cIndex)
+        points = [cIndex[:-1] + (d * i) // 4 for i in (1, 2, 3)]
+        return np.unique(np.concatenate(points))
+
+    def controlInterp(self, control, cRows, cCols, rows, cols):
+        """ interpolate control values on the cRows x cCols grid to the rows x
+        cols grid (pixel indices) with an interpolating bicubic spline. The
+        spline is linear in the control values, so it is evaluated as
+        products with the 1D spline weights """
+        wRows = self.splineWeights(cRows, rows)
+        wCols = self.splineWeights(cCols, cols)
+        return [wRows @ z @ wCols.T for z in control]
+
+    def splineWeights(self, knots, x):
+        """ weights of each knot in the interpolating spline at x (cubic, or
+        lower order if there are fewer than 4 knots) """
+        return make_interp_spline(knots, np.eye(knots.size),
+                                  k=min(3, knots.size - 1))(x)
+
+    def approxError(self, exact, approx, geographic):
+        """ max distance (m) between exact and approximate points, which
+        are lat, lon if geographic """
+        dx, dy = exact[0] - approx[0], exact[1] - approx[1]
+        if geographic:
+            # ~m per degree
+            dx = dx * 111320.
+            dy = dy * 111320. * np.cos(np.radians(exact[0]))
+        if dx.size == 0:
+            return 0.
+        return np.max(np.hypot(dx, dy))
 
     def xymtoImage(self, x, y, scale=None):
         """ x,y  is an nparray of points in PS meters, output xi,yi image
@@ -110,10 +255,10 @@ class geodat:
     def xykmtoImage(self, x, y):
         return self.xymtoImage(x, y, scale=1000)
 
-    def xykmtoll(self, x, y):
+    def xykmtoll(self, x, y, **kwargs):
         """ x, y  is an nparray of points in PS KILOmeters, output lat,lon in
         similar array """
-        return self.xymtoll(x, y, scale=1000)
+        return self.xymtoll(x, y, scale=1000, **kwargs)
 
     def sizeInPixels(self):
         return self.xs, self.ys
@@ -145,6 +290,38 @@ class geodat:
     def pixSizeInKm(self):
         return self.dx*0.001, self.dy*0.001
 
+    def kmBoundsToWindow(self, xmin, ymin, xmax, ymax):
+        """ return the ((r0, r1), (c0, c1)) pixel window that covers the box
+        xmin, ymin, xmax, ymax in km, clipped to the image """
+        dx, dy = self.pixSizeInKm()
+        c0 = max(int(np.floor((xmin - self.x0) / dx)), 0)
+        c1 = min(int(np.ceil((xmax - self.x0) / dx)) + 1, self.xs)
+        r0 = max(int(np.floor((ymin - self.y0) / dy)), 0)
+        r1 = min(int(np.ceil((ymax - self.y0) / dy)) + 1, self.ys)
+        if c1 <= c0 or r1 <= r0:
+            myerror(f'geodat.kmBoundsToWindow: box {xmin}, {ymin}, {xmax}, '
+                    f'{ymax} does not overlap image')
+        return (r0, r1), (c0, c1)
+
+    def applyWindow(self, window):
+        """ Shrink geodat in place to the ((r0, r1), (c0, c1)) window,
+        where rows count up from the origin (y0) """
+        (r0, r1), (c0, c1) = window
+        self.x0 += c0 * self.dx * 0.001
+        self.y0 += r0 * self.dy * 0.001
+        self.xs, self.ys = c1 - c0, r1 - r0
+
+    def decimate(self, factor, offset=None):
+        """ Coarsen geodat in place by an integer factor, where each new pixel
+        spans factor x factor old pixels. offset is the position of the new
+        first pixel center in old pixels [(factor-1)/2, a block average] """
+        if offset is None:
+            offset = (factor - 1) / 2
+        self.x0 += offset * self.dx * 0.001
+        self.y0 += offset * self.dy * 0.001
+        self.xs, self.ys = self.xs // factor, self.ys // factor
+        self.dx, self.dy = self.dx * factor, self.dy * factor
+
     def xd(self):
         """ return geo information as an 'xd' np matrix """
         xd = np.array([[self.xs, self.ys], [self.dx, self.dy],
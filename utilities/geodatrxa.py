@@ -4,9 +4,9 @@ import math
 import os
 from datetime import datetime
 import scipy.interpolate as interp
-import pyproj
 import json
 from utilities import myerror
+from utilities.projCache import getTransformer
 
 
 class geodatrxa:
@@ -46,7 +46,7 @@ class geodatrxa:
         self.stateTime = None
         self.nState, self.tState, self.dTState = -1, -1, -1
         self.position = self.velocity = []
-        self.llzToEcef = None
+        self.stateSpline = None
 
         self.minT, self.maxT = -1, -1
         self.fx, self.fy, self.fz, self.fvx, self.fvy, self.fvz = [None]*6
@@ -469,17 +469,20 @@ class geodatrxa:
             return np.array([vx, vy, vz])
 
     def lltoecef(self, lat, lon, zelev):
-        ''' convert llz to ecef'''
-        #    return pyproj.transform(self.llz, self.ecef, lon, lat, zelev,
-        #                            radians=False)
-        if self.llzToEcef is None:
-            self.ecef = pyproj.Proj(proj='geocent', ellps='WGS84',
-                                    datum='WGS84')
-            self.llz = pyproj.Proj(proj='latlong', ellps='WGS84',
-                                   datum='WGS84')
-            self.llzToEcef = pyproj.Transformer.from_proj(self.llz, self.ecef)
-
-        return self.llzToEcef.transform(lat, lon, zelev, radians=False)
+        ''' convert llz to ecef (WGS84 lat, lon, height -> geocentric)'''
+        return getTransformer('EPSG:4979', 'EPSG:4978').transform(lat, lon,
+                                                                  zelev)
+
+    def interpState(self, t):
+        ''' interpolate position and velocity at an array of times t with one
+        cubic spline, returning (3, n) arrays (nan outside the state
+        vectors) '''
+        if self.stateSpline is None:
+            self.stateSpline = interp.make_interp_spline(
+                self.stateTime, np.hstack((self.position, self.velocity)),
+                k=3)
+        state = self.stateSpline(t, extrapolate=False).T
+        return state[0:3], state[3:6]
 
     def ReH(self, myTime):
         sPt = np.array(self.interpPos(myTime))
@@ -508,9 +511,60 @@ class geodatrxa:
         # correct to near range for multi-look,  the sub
         r = (np.sqrt(np.dot(dr, dr)) - self.rNearSLP)/self.slpRg
         az = (myTime - self.t0) * self.prf
-        print(i)  # print(r,az,i)
+        # print(r,az,i)
         return r, az, myTime
 
+    def llzToRA(self, lat, lon, z, initT=None, maxIter=50, tolerance=1e-5,
+                chunkSize=1 << 20):
+        ''' geocode arrays of lat/lon/z to range/azimuth coordinates with
+        the same zero Doppler Newton iteration as llzPtToRA, for all points
+        at once. Each point stops when its time step is < tolerance (s), so
+        later iterations only update the points still converging. Points
+        are processed in chunks of chunkSize to bound memory.
+        Returns r, az, time arrays shaped like lat (nan if the orbit does
+        not cover a point) '''
+        lat, lon, z = np.broadcast_arrays(np.asarray(lat, dtype=np.float64),
+                                          np.asarray(lon, dtype=np.float64),
+                                          np.asarray(z, dtype=np.float64))
+        if initT is None:
+            initT = self.t0 + 0.5 * self.na * self.nla / self.prf
+        n = lat.size
+        r, az, myTime = np.empty(n), np.empty(n), np.empty(n)
+        for i in range(0, n, chunkSize):
+            j = slice(i, i + chunkSize)
+            tPt = np.array(self.lltoecef(lat.reshape(-1)[j],
+                                         lon.reshape(-1)[j],
+                                         z.reshape(-1)[j]))
+            myTime[j], dist = self.zeroDopplerTime(tPt, initT, maxIter,
+                                                   tolerance)
+            # correct to near range for multi-look
+            r[j] = (dist - self.rNearSLP) / self.slpRg
+            az[j] = (myTime[j] - self.t0) * self.prf
+        return r.reshape(lat.shape), az.reshape(lat.shape), \
+            myTime.reshape(lat.shape)
+
+    def zeroDopplerTime(self, tPt, initT, maxIter=50, tolerance=1e-5):
+        ''' Newton iteration for the zero Doppler time of ecef points tPt
+        (3, n), with a convergence mask so converged points drop out.
+        Returns the times and the ranges from the satellite (m) '''
+        n = tPt.shape[1]
+        myTime = np.full(n, initT, dtype=np.float64)
+        dist = np.full(n, np.nan)
+        active = np.arange(n)
+        for i in range(0, maxIter):
+            sPt, vPt = self.interpState(myTime[active])
+            dr = tPt[:, active] - sPt
+            # assume zero dop geom for now
+            step = np.einsum('ij,ij->j', dr, vPt) / \
+                -np.einsum('ij,ij->j', vPt, vPt)
+            myTime[active] -= step
+            dist[active] = np.sqrt(np.einsum('ij,ij->j', dr, dr))
+            # keep iterating points that have not converged (nan is done)
+            active = active[np.abs(step) >= tolerance]
+            if active.size == 0:
+                break
+        return myTime, dist
+
     def writeGeodatFile(self, fileName):
         with open(fileName, 'w') as fp:
             print('; Image name: ', file=fp)
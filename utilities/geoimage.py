@@ -1,14 +1,38 @@
 # geoimage.py
 import numpy as np
 from scipy.interpolate import RegularGridInterpolator
+from scipy import ndimage
 from utilities.readImage import readImage
 from utilities.writeImage import writeImage
 from utilities.myerror import myerror
+from utilities.mywarning import mywarning
 from utilities import geodat
+from utilities.floatPrecision import getFloatType
 import os
 # from osgeo.gdalconst import *
 from osgeo import gdal, gdal_array, osr
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+
+# components interpolated for each geoType
+interpComponents = {'scalar': ['x'], 'velocity': ['vx', 'vy', 'v'],
+                    'error': ['ex', 'ey', 'e']}
+
+# named output profiles for writeMyTiff - predictor=True picks floating point
+# (3) prediction for float data and horizontal (2) for integers
+tiffProfiles = {'fast-write': {'compress': 'ZSTD', 'level': 1,
+                               'predictor': True, 'blockSize': 512},
+                'balanced': {'compress': 'DEFLATE', 'level': 6,
+                             'predictor': True, 'blockSize': 512},
+                'smallest-file': {'compress': 'ZSTD', 'level': 19,
+                                  'predictor': True, 'blockSize': 1024},
+                'lzw': {'compress': 'LZW', 'level': None, 'predictor': True,
+                        'blockSize': 512}}
+
+# source pixel maps for reproject, keyed by (source grid, target grid)
+pixelMapCache = OrderedDict()
+pixelMapCacheSize = {'size': 4}
 
 # -------------------------------------------------------------------------
 # class defintion for an image object, which covers PS data as geodat or tiff
@@ -31,6 +55,10 @@ class geoimage:
         self.velDate = None
         self.fileName = None
         self.fileRoot = None
+        # components waiting to be read and magnitudes computed on access
+        self.pendingFiles, self.lazyMagnitudes = {}, {}
+        self.splineCoeffs = {}
+        self.cacheMagnitude = False
         if x is not None:
             self.x = x
         if vx is None:
@@ -52,6 +80,23 @@ class geoimage:
             if self.verbose:
                 print('Type ', self.geoType)
 
+    # -------------------------------------------------------------------------
+    # Lazy attributes - only called if attribute not found in the normal way
+    # -------------------------------------------------------------------------
+    def __getattr__(self, name):
+        """ load pending components on first access and compute v/e on
+        demand """
+        if name in self.__dict__.get('pendingFiles', {}):
+            return self.loadComponent(name)
+        if name in self.__dict__.get('lazyMagnitudes', {}):
+            return self.computeMagnitude(name)
+        # build RegularGridInterpolators on request (e.g., vxInterp)
+        if name.endswith('Interp') and \
+                name[:-6] in self.__dict__.get('interpComponents', []):
+            return self.gridInterpolator(name[:-6])
+        raise AttributeError(
+            f"'geoimage' object has no attribute '{name}'")
+
     # -------------------------------------------------------------------------
     # Set and errorcheck geotype
     # -------------------------------------------------------------------------
@@ -82,7 +127,9 @@ class geoimage:
     # -------------------------------------------------------------------------
     # Compute matrix of xy grid points
     # -------------------------------------------------------------------------
-    def xyGrid(self):
+    def xyGrid(self, dense=False):
+        """ xyGrid - xGrid, yGrid in km as read-only broadcast views of xx
+        and yy, or writable (sy, sx) arrays if dense=True """
         #
         # if one done grid points not computed, then compute
         if len(self.xx) == 0:
@@ -90,11 +137,10 @@ class geoimage:
         sx, sy = self.geo.sizeInPixels()
         #
         # setup array
-        self.xGrid, self.yGrid = np.zeros((sy, sx)), np.zeros((sy, sx))
-        for i in range(0, sy):
-            self.xGrid[i, :] = self.xx
-        for i in range(0, sx):
-            self.yGrid[:, i] = self.yy
+        self.xGrid = np.broadcast_to(self.xx, (sy, sx))
+        self.yGrid = np.broadcast_to(self.yy[:, np.newaxis], (sy, sx))
+        if dense:
+            self.xGrid, self.yGrid = np.array(self.xGrid), np.array(self.yGrid)
 
     def parseMyMeta(self, metaFile):
         print(metaFile)
@@ -124,85 +170,453 @@ class geoimage:
     #  setup interpolation functions
     # -------------------------------------------------------------------------
 
-    def setupInterp(self, method='linear'):
-        """ set up interpolation for scalar (xInterp) or velocity/eror
-        (vxInterp, vyInterp, vInterp)  """
+    def setupInterp(self, method='linear', order=3, splineFile=None):
+        """ set up interpolation for scalar (x) or velocity/error
+        (vx, vy, v / ex, ey, e). Linear interpolation uses a shared cell
+        index/weight computation for all components, so there is nothing to
+        build. method='spline' uses spline prefilter coefficients of the
+        given order (2-5), computed once per component array and cached
+        (and saved/loaded as splineFile.component.splineN.npy if splineFile
+        is given and the file matches this grid). method='nanlinear' is
+        bilinear interpolation that averages only the valid (not nan)
+        corners, using masks computed once per component. Other methods use
+        RegularGridInterpolator (xInterp, vxInterp, ...), which are also
+        available for linear by attribute access. """
     #
         if len(self.xx) < 0:
             myerror('\n\nsetupInterp: x, y limits not set\n\n')
+        if method == 'spline' and order not in [2, 3, 4, 5]:
+            myerror(f'setupInterp: invalid spline order {order}')
         #
-        # setup interp - flip xy for row colum
-        #
+        self.interpMethod = method
+        self.splineOrder = order
+        self.interpComponents = interpComponents[self.geoType]
+        if self.isWindowed():
+            # arrays are read for each window by interpGeo
+            self.windowCache.clear()
+            return
+        # hold the arrays, so lazy magnitudes are only computed once
+        self.interpArrays = [getattr(self, c) for c in self.interpComponents]
+        # drop any interpolators from previous setups
+        for myType in self.interpComponents:
+            self.__dict__.pop(f'{myType}Interp', None)
+        if method == 'spline':
+            for myType, myArray in zip(self.interpComponents,
+                                       self.interpArrays):
+                self.splineCoefficients(myType, myArray, order, splineFile)
+        elif method == 'nanlinear':
+            self.noDataMasks = [self.noDataMask(myArray)
+                                for myArray in self.interpArrays]
+        elif method != 'linear':
+            for myType in self.interpComponents:
+                self.gridInterpolator(myType)
+
+    def noDataMask(self, myArray):
+        """ return the array with nodata filled with 0, the valid (1) / nodata
+        (0) mask and a flag for each cell that is true if all 4 corners are
+        valid """
+        valid = np.logical_not(np.isnan(myArray))
+        filled = np.where(valid, myArray, 0).astype(myArray.dtype)
+        cellFull = np.logical_and(np.logical_and(valid[:-1, :-1],
+                                                 valid[:-1, 1:]),
+                                  np.logical_and(valid[1:, :-1],
+                                                 valid[1:, 1:]))
+        return filled, valid.view(np.uint8), cellFull.reshape(-1)
+
+    def noDataPoints(self, x, y):
+        """ nodata aware bilinear interpolation at in-bounds points x, y (km)
+        for each component. Cells with nodata corners return the weighted
+        average of the valid corners (nan if none) """
+        i00, wx, wy = self.cellWeights(x, y)
+        # index of each cell in the (ny-1, nx-1) cell grid
+        nx = len(self.xx)
+        iCell = i00 - i00 // nx
+        results = []
+        for filled, valid, cellFull in self.noDataMasks:
+            result = self.bilinearGather(filled, i00, wx, wy)
+            # renormalise only the cells with nodata corners
+            partial = np.logical_not(cellFull[iCell])
+            if np.any(partial):
+                i00p, wxp, wyp = i00[partial], wx[partial], wy[partial]
+                weight = self.bilinearGather(valid, i00p, wxp, wyp)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    result[partial] = np.where(
+                        weight > 0, result[partial] / weight, np.nan)
+            results.append(result)
+        return results
+
+    def splineCoefficients(self, myType, myArray, order, splineFile=None):
+        """ return the cached spline prefilter coefficients for a component,
+        computing them (nodata filled with 0) or loading from disk if
+        needed. Cached coefficients are only reused for the same array
+        (in-place edits need a new array or readFiles to take effect), and
+        files only for the same grid, which is saved with them as
+        splineFile.component.splineN.grid.npy """
+        cached = self.splineCoeffs.get((myType, order))
+        if cached is not None and cached[0] is myArray:
+            return cached[1]
+        coeffFile, coeffs = None, None
+        grid = np.array([*myArray.shape, self.geo.x0, self.geo.y0,
+                         self.geo.dx, self.geo.dy], dtype=np.float64)
+        if splineFile is not None:
+            coeffFile = f'{splineFile}.{myType}.spline{order}.npy'
+            gridFile = f'{splineFile}.{myType}.spline{order}.grid.npy'
+        # files without a grid (older versions) are rewritten below
+        if coeffFile is not None and os.path.exists(gridFile):
+            if np.array_equal(np.load(gridFile), grid):
+                coeffs = np.load(coeffFile, mmap_mode='r')
+            else:
+                # leave the file for the grid it was made for
+                mywarning(f'geoimage.splineCoefficients: {coeffFile} does '
+                          'not match this grid, recomputing')
+                coeffFile = None
+        if coeffs is None:
+            coeffs = ndimage.spline_filter(np.nan_to_num(myArray, nan=0.0),
+                                           order=order,
+                                           output=getFloatType(),
+                                           mode='mirror')
+            if coeffFile is not None:
+                np.save(coeffFile, coeffs)
+                np.save(gridFile, grid)
+        if coeffs.shape != myArray.shape:
+            myerror(f'geoimage.splineCoefficients: {myType} coefficients '
+                    f'{coeffs.shape} do not match data {myArray.shape}')
+        self.splineCoeffs[(myType, order)] = (myArray, coeffs)
+        return coeffs
+
+    def splinePoints(self, x, y):
+        """ evaluate spline interpolation at in-bounds points x, y (km) for
+        each component, nan where a bilinear corner is nodata """
+        dx, dy = self.geo.pixSizeInKm()
+        coords = np.array([(y - self.yy[0]) / dy, (x - self.xx[0]) / dx])
+        i00, wx, wy = self.cellWeights(x, y)
+        results = []
+        for myType, myArray in zip(self.interpComponents, self.interpArrays):
+            coeffs = self.splineCoeffs[(myType, self.splineOrder)][1]
+            result = ndimage.map_coordinates(coeffs, coords,
+                                             order=self.splineOrder,
+                                             prefilter=False, mode='mirror')
+            result[np.isnan(self.bilinearGather(myArray, i00, wx, wy))] = \
+                np.nan
+            results.append(result)
+        return results
+
+    def gridInterpolator(self, myType):
+        """ build, save and return RegularGridInterpolator for myType (e.g.,
+        vx for vxInterp) - flip xy for row colum """
         xy = (self.yy, self.xx)
+        myArray = self.interpArrays[self.interpComponents.index(myType)]
+        myInterp = RegularGridInterpolator(xy, myArray,
+                                           method=self.interpMethod)
+        setattr(self, f'{myType}Interp', myInterp)
+        return myInterp
 
-        if self.geoType == 'scalar':
-            self.xInterp = RegularGridInterpolator(xy,
-                                                   self.x, method=method)
-        if self.geoType == 'velocity':
-            self.vxInterp = RegularGridInterpolator(xy,
-                                                    self.vx, method=method)
-            self.vyInterp = RegularGridInterpolator(xy,
-                                                    self.vy, method=method)
-            self.vInterp = RegularGridInterpolator(xy, self.v, method=method)
-        if self.geoType == 'error':
-            self.exInterp = RegularGridInterpolator(xy,
-                                                    self.ex, method=method)
-            self.eyInterp = RegularGridInterpolator(xy,
-                                                    self.ey, method=method)
-            self.eInterp = RegularGridInterpolator(xy, self.e, method=method)
+    # -------------------------------------------------------------------------
+    # shared cell indices and bilinear weights
+    # -------------------------------------------------------------------------
+    def cellWeights(self, x, y):
+        """ for in-bounds points x, y (km) return the flat index of the lower
+        left corner of each cell and the fractional offsets wx, wy """
+        ny, nx = len(self.yy), len(self.xx)
+        dx, dy = self.geo.pixSizeInKm()
+        fx = (x - self.xx[0]) / dx
+        fy = (y - self.yy[0]) / dy
+        # clip so points on the last row/column use the last cell
+        col = np.clip(np.floor(fx).astype(np.intp), 0, max(nx - 2, 0))
+        row = np.clip(np.floor(fy).astype(np.intp), 0, max(ny - 2, 0))
+        floatType = getFloatType()
+        wx = (fx - col).astype(floatType, copy=False)
+        wy = (fy - row).astype(floatType, copy=False)
+        return row * nx + col, wx, wy
+
+    def bilinearGather(self, myArray, i00, wx, wy):
+        """ bilinear interpolation of myArray with cell indices and weights
+        from cellWeights """
+        nx = myArray.shape[1]
+        z = myArray.reshape(-1)
+        z0 = z[i00] * (1 - wx) + z[i00 + 1] * wx
+        z1 = z[i00 + nx] * (1 - wx) + z[i00 + nx + 1] * wx
+        return z0 * (1 - wy) + z1 * wy
+
+    def interpPoints(self, x, y):
+        """ interpolate all components at in-bounds points x, y (km),
+        returning a list of 1-D results """
+        if self.interpMethod == 'spline':
+            return self.splinePoints(x, y)
+        if self.interpMethod == 'nanlinear':
+            return self.noDataPoints(x, y)
+        if self.interpMethod != 'linear':
+            xy = np.array([y, x]).transpose()
+            return [getattr(self, f'{myType}Interp')(xy)
+                    for myType in self.interpComponents]
+        # compute indices and weights once, and use for all components
+        i00, wx, wy = self.cellWeights(x, y)
+        return [self.bilinearGather(myArray, i00, wx, wy)
+                for myArray in self.interpArrays]
+
+    # -------------------------------------------------------------------------
+    # windows for point driven reads
+    # -------------------------------------------------------------------------
+    def isWindowed(self):
+        """ True if in windowed mode with components not yet read in full """
+        return self.__dict__.get('windowed', False) and \
+            any(c in self.pendingFiles for c in self.interpComponents)
+
+    def windowGeoimage(self, x, y):
+        """ return a geoimage for the window around the in-bounds points x, y
+        (km) with a one pixel halo, reusing a cached window if one covers it.
+        Returns None if no points are in bounds """
+        xgood = np.logical_and(x >= self.xx[0], x <= self.xx[-1])
+        ygood = np.logical_and(y >= self.yy[0], y <= self.yy[-1])
+        igood = np.logical_and(xgood, ygood)
+        if not np.any(igood):
+            return None
+        dx, dy = self.geo.pixSizeInKm()
+        window = self.geo.kmBoundsToWindow(np.min(x[igood]) - dx,
+                                           np.min(y[igood]) - dy,
+                                           np.max(x[igood]) + dx,
+                                           np.max(y[igood]) + dy)
+        (r0, r1), (c0, c1) = window
+        # reuse the most recent cached window that contains this one
+        for key in reversed(self.windowCache):
+            (cr0, cr1), (cc0, cc1) = key
+            if cr0 <= r0 and cr1 >= r1 and cc0 <= c0 and cc1 >= c1:
+                self.windowCache.move_to_end(key)
+                return self.windowCache[key]
+        # read window
+        subImage = geoimage(geoType=self.geoType, verbose=False)
+        subImage.geo = geodat(x0=self.geo.x0, y0=self.geo.y0,
+                              xs=self.geo.xs, ys=self.geo.ys,
+                              dx=self.geo.dx, dy=self.geo.dy,
+                              domain=self.geo.domain,
+                              wkt=self.geo.xyprojSRS, verbose=False)
+        subImage.geo.applyWindow(window)
+        subImage.xyCoordinates()
+        for myType in self.interpComponents:
+            if myType in self.pendingFiles:
+                setattr(subImage, myType, self.readComponent(myType, window))
+            elif myType in self.__dict__:
+                setattr(subImage, myType,
+                        getattr(self, myType)[r0:r1, c0:c1])
+        subImage.lazyMagnitudes = self.lazyMagnitudes
+        for myType in self.lazyMagnitudes:
+            subImage.__dict__.pop(myType, None)
+        subImage.setupInterp(method=self.interpMethod, order=self.splineOrder)
+        # save and drop the least recently used window if needed
+        self.windowCache[window] = subImage
+        while len(self.windowCache) > self.windowCacheSize:
+            self.windowCache.popitem(last=False)
+        return subImage
 
     # -------------------------------------------------------------------------
     # interpolate geo image
     # -------------------------------------------------------------------------
-    def interpGeo(self, x, y):
+    def interpGeo(self, x, y, out=None, chunkSize=None, nThreads=1):
         """ interpolate velocity or x at points x and y, which are in km
-        (note x,y is c-r even though data r-c)"""
-        # save the original shape
-        shapeSave = x.shape
-        # flatten and do bounds check
-        x1 = x.flatten()
-        y1 = y.flatten()
-        xgood = np.logical_and(x1 >= self.xx[0], x1 <= self.xx[-1])
-        ygood = np.logical_and(y1 >= self.yy[0], y1 <= self.yy[-1])
-        igood = np.logical_and(xgood, ygood)
-        #
-        # save inbound locations
-        xy = np.array([y1[igood], x1[igood]]).transpose()
+        (note x,y is c-r even though data r-c)
+        out = array (scalar) or tuple of arrays shaped like x to write the
+        results into, so buffers can be reused
+        chunkSize = process the points in batches of this size, spread over
+        nThreads threads, so huge point sets use bounded memory"""
+        if 'interpMethod' not in self.__dict__:
+            self.setupInterp()
+        # read and interpolate only the part of the image that is needed
+        if self.isWindowed():
+            subImage = self.windowGeoimage(x, y)
+            if subImage is not None:
+                return subImage.interpGeo(x, y, out=out, chunkSize=chunkSize,
+                                          nThreads=nThreads)
+            # all points out of bounds
+            out = self.interpOut(x, out, getFloatType())
+            for o in out:
+                o[...] = np.nan
+            return out[0] if self.geoType == 'scalar' else out
+        out = self.interpOut(
+            x, out, np.result_type(*self.interpArrays, getFloatType()))
+        outFlat = [o.reshape(-1) for o in out]
+        if chunkSize is None:
+            chunkSize = max(x.size, 1)
+
+        def interpChunk(i):
+            # copy only this chunk, which also works for broadcast views
+            x1 = np.asarray(x.flat[i:i + chunkSize])
+            y1 = np.asarray(y.flat[i:i + chunkSize])
+            # bounds check
+            xgood = np.logical_and(x1 >= self.xx[0], x1 <= self.xx[-1])
+            ygood = np.logical_and(y1 >= self.yy[0], y1 <= self.yy[-1])
+            igood = np.logical_and(xgood, ygood)
+            # interpolate in bounds, nan elsewhere
+            results = self.interpPoints(x1[igood], y1[igood])
+            for myOut, result in zip(outFlat, results):
+                myOut[i:i + chunkSize] = np.nan
+                myOut[i:i + chunkSize][igood] = result
         #
+        chunks = range(0, x.size, chunkSize)
+        if nThreads > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=nThreads) as pool:
+                list(pool.map(interpChunk, chunks))
+        else:
+            for i in chunks:
+                interpChunk(i)
         if self.geoType == 'scalar':
-            result = np.zeros(x1.transpose().shape)
-            result[:] = np.NaN
-            result[igood] = self.xInterp(xy)
-            result = np.reshape(result, shapeSave)
-            return result
-        elif self.geoType == 'velocity':
-            # empty arrays the right size
-            vxr = np.zeros(x1.transpose().shape)
-            vxr[:] = np.NaN
-            vyr = vxr.copy()
-            vr = vxr.copy()
-            # interpolate in bounds
-            vxr[igood] = self.vxInterp(xy)
-            vyr[igood] = self.vyInterp(xy)
-            vr[igood] = self.vInterp(xy)
-            vxr = np.reshape(vxr, shapeSave)
-            vyr = np.reshape(vyr, shapeSave)
-            vr = np.reshape(vr, shapeSave)
-            return vxr, vyr, vr
-        elif self.geoType == 'error':
-            # empty arrays the right size
-            exr = np.zeros(x1.transpose().shape)
-            exr[:] = np.NaN
-            eyr = exr.copy()
-            er = exr.copy()
-            # interpolate in bounds
-            exr[igood] = self.exInterp(xy)
-            eyr[igood] = self.eyInterp(xy)
-            er[igood] = self.eInterp(xy)
-            exr = np.reshape(exr, shapeSave)
-            eyr = np.reshape(eyr, shapeSave)
-            er = np.reshape(er, shapeSave)
-            return exr, eyr, er
+            return out[0]
+        return out
+
+    def interpOut(self, x, out, dtype):
+        """ check the interpGeo out array(s) and return them as a tuple, or
+        new arrays of dtype if out is None """
+        if out is None:
+            out = tuple(np.empty(x.shape, dtype=dtype)
+                        for myType in self.interpComponents)
+        elif isinstance(out, np.ndarray):
+            out = (out,)
+        if len(out) != len(self.interpComponents) or \
+                any(o.shape != x.shape or not o.flags.c_contiguous
+                    for o in out):
+            myerror(f'geoimage.interpGeo: out should be '
+                    f'{len(self.interpComponents)} contiguous array(s) with '
+                    f'shape {x.shape}')
+        return out
+
+    # -------------------------------------------------------------------------
+    # reproject onto another grid
+    # -------------------------------------------------------------------------
+    def gridKey(self, geo):
+        """ hashable description of a geodat grid """
+        return (geo.x0, geo.y0, geo.xs, geo.ys, geo.dx, geo.dy,
+                geo.xyprojSRS)
+
+    def pixelMap(self, targetGeo, tolerance=0.01, nThreads=1):
+        """ return x, y (km) in this image's projection for each pixel of the
+        targetGeo grid, and the cos, sin of the rotation from target to
+        source axes (None if the projections match). Maps are computed with
+        approximate transforms (tolerance m) and cached per grid pair """
+        key = (self.gridKey(self.geo), self.gridKey(targetGeo), tolerance)
+        if key in pixelMapCache:
+            pixelMapCache.move_to_end(key)
+            return pixelMapCache[key]
+        target = geoimage(verbose=False)
+        target.geo = targetGeo
+        target.xyCoordinates()
+        target.xyGrid()
+        if targetGeo.xyprojSRS == self.geo.xyprojSRS:
+            pixelMap = (target.xGrid, target.yGrid, None, None)
+        else:
+            # target xy -> lat/lon -> source xy, in place after the first
+            x, y = targetGeo.xykmtoll(target.xGrid, target.yGrid,
+                                      tolerance=tolerance, nThreads=nThreads)
+            self.geo.lltoxykm(x, y, out=(x, y), tolerance=tolerance,
+                              nThreads=nThreads)
+            # rotation from the jacobian d(source xy)/d(target xy)
+            dx, dy = targetGeo.pixSizeInKm()
+            dxdr, dxdc = np.gradient(x, dy, dx)
+            dydr, dydc = np.gradient(y, dy, dx)
+            theta = np.arctan2(dydc - dxdr, dxdc + dydr)
+            del dxdr, dxdc, dydr, dydc
+            pixelMap = (x, y, np.cos(theta).astype(np.float32),
+                        np.sin(theta).astype(np.float32))
+        pixelMapCache[key] = pixelMap
+        while len(pixelMapCache) > pixelMapCacheSize['size']:
+            pixelMapCache.popitem(last=False)
+        return pixelMap
+
+    def reproject(self, targetGeo, method='linear', tolerance=0.01,
+                  chunkSize=1 << 20, nThreads=1):
+        """ resample onto the targetGeo grid (any origin, spacing or
+        projection) and return a new geoimage. method is any setupInterp
+        method. The source pixel map is cached per grid pair (see
+        pixelMap), so repeated reprojections onto the same grid only
+        interpolate. Points are interpolated in chunks of chunkSize on
+        nThreads threads. Velocity (and error) components are rotated into
+        the target axes; v and e are resampled as is """
+        x, y, cosA, sinA = self.pixelMap(targetGeo, tolerance=tolerance,
+                                         nThreads=nThreads)
+        result = geoimage(geoType=self.geoType, verbose=False)
+        result.geo = geodat(x0=targetGeo.x0, y0=targetGeo.y0,
+                            xs=targetGeo.xs, ys=targetGeo.ys,
+                            dx=targetGeo.dx, dy=targetGeo.dy,
+                            domain=targetGeo.domain,
+                            wkt=targetGeo.xyprojSRS, verbose=False)
+        result.xyCoordinates()
+        # keep the caller's interpolation setup, which is restored below
+        saved = self.interpState()
+        try:
+            self.reprojectComponents(result, x, y, method, chunkSize,
+                                     nThreads)
+        finally:
+            for key in self.interpState()[0]:
+                del self.__dict__[key]
+            self.__dict__.update(saved[0])
+            if saved[1] is not None:
+                self.windowCache.clear()
+                self.windowCache.update(saved[1])
+        if cosA is not None and self.geoType != 'scalar':
+            self.rotateComponents(result, cosA, sinA, chunkSize, nThreads)
+        return result
+
+    def interpState(self):
+        """ return the attributes set by setupInterp and a copy of the
+        window cache (None if not windowed) """
+        keys = ['interpMethod', 'splineOrder', 'interpComponents',
+                'interpArrays', 'noDataMasks']
+        state = {k: v for k, v in self.__dict__.items()
+                 if k in keys or k.endswith('Interp')}
+        windows = self.__dict__.get('windowCache')
+        return state, None if windows is None else OrderedDict(windows)
+
+    def reprojectComponents(self, result, x, y, method, chunkSize,
+                            nThreads):
+        """ interpolate the components at x, y into result for reproject
+        """
+        # interpolate main components (x, vx/vy/v or ex/ey/e)
+        self.setupInterp(method=method)
+        images = [self]
+        # errors carried with velocities
+        if self.geoType == 'velocity' and self.hasComponent('ex') and \
+                self.hasComponent('ey'):
+            errImage = geoimage(geoType='error', verbose=False)
+            errImage.geo, errImage.xx, errImage.yy = \
+                self.geo, self.xx, self.yy
+            errImage.ex, errImage.ey = self.ex, self.ey
+            errImage.lazyMagnitudes = {'e': ('ex', 'ey')}
+            errImage.__dict__.pop('e', None)
+            errImage.setupInterp(method=method)
+            images.append(errImage)
+        for myImage in images:
+            out = myImage.interpGeo(x, y, chunkSize=chunkSize,
+                                    nThreads=nThreads)
+            if myImage.geoType == 'scalar':
+                out = (out,)
+            for myType, myArray in zip(myImage.interpComponents, out):
+                setattr(result, myType, myArray)
+
+    def rotateComponents(self, myImage, cosA, sinA, chunkSize, nThreads):
+        """ rotate vx, vy and (propagate) ex, ey of myImage in place from
+        source to target axes, in row chunks of ~chunkSize points """
+        ny, nx = cosA.shape
+        rows = max(chunkSize // max(nx, 1), 1)
+        vectors = [x for x in [('vx', 'vy'), ('ex', 'ey')]
+                   if myImage.hasComponent(x[0])]
+
+        def rotateChunk(r0):
+            c, s = cosA[r0:r0 + rows], sinA[r0:r0 + rows]
+            for xName, yName in vectors:
+                a = getattr(myImage, xName)[r0:r0 + rows]
+                b = getattr(myImage, yName)[r0:r0 + rows]
+                if xName == 'vx':
+                    a[...], b[...] = c * a + s * b, c * b - s * a
+                else:
+                    # uncorrelated errors
+                    a[...], b[...] = np.hypot(c * a, s * b), \
+                        np.hypot(s * a, c * b)
+        #
+        chunks = range(0, ny, rows)
+        if nThreads > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=nThreads) as pool:
+                list(pool.map(rotateChunk, chunks))
+        else:
+            for r0 in chunks:
+                rotateChunk(r0)
 
     def readGeodat(self, geoFile):
         if self.verbose:
@@ -214,19 +628,60 @@ class geoimage:
         else:
             myerror('Missing geodat file '+geoFile)
 
-    def readMyTiff(self, tiffFile):
-        """ read a tiff file and return the array """
+    def readMyTiff(self, tiffFile, window=None, decimation=1, bands=None):
+        """ read a tiff file and return the array. window=((r0, r1), (c0, c1))
+        reads a subregion with rows counted up from the origin (y0).
+        decimation=k block averages k x k pixels, which gdal takes from the
+        closest overview that is not coarser, so only those bytes are read.
+        bands=[1, 2..] reads those bands in one pass as a [band, y, x] array
+        """
         try:
             gdal.AllRegister()
             ds = gdal.Open(tiffFile)
-            band = ds.GetRasterBand(1)
-            arr = band.ReadAsArray()
-            arr = np.flipud(arr)
+            if window is None and decimation == 1 and bands is None:
+                arr = ds.GetRasterBand(1).ReadAsArray()
+            else:
+                if window is None:
+                    window = ((0, ds.RasterYSize), (0, ds.RasterXSize))
+                # tiff rows run top down, so flip the row range
+                (r0, r1), (c0, c1) = window
+                bx, by = (c1 - c0) // decimation, (r1 - r0) // decimation
+                region = (c0, ds.RasterYSize - r1, c1 - c0, r1 - r0)
+                if bands is None:
+                    arr = ds.GetRasterBand(1).ReadAsArray(
+                        *region, buf_xsize=bx, buf_ysize=by,
+                        resample_alg=gdal.GRIORA_Average)
+                else:
+                    arr = ds.ReadAsArray(*region, buf_xsize=bx, buf_ysize=by,
+                                         resample_alg=gdal.GRIORA_Average,
+                                         band_list=bands)
+                    arr = arr.reshape(len(bands), by, bx)
+            arr = np.flip(arr, axis=-2)
             ds = None
         except Exception:
             myerror("geoimage.readMyTiff: error reading tiff file "+tiffFile)
         return arr
 
+    def tiffBandNames(self, tiffFile):
+        """ return {description: band number} for a multi-band tiff """
+        try:
+            gdal.AllRegister()
+            ds = gdal.Open(tiffFile)
+            bandNames = {ds.GetRasterBand(i).GetDescription(): i
+                         for i in range(1, ds.RasterCount + 1)}
+            ds = None
+        except Exception:
+            myerror("geoimage.tiffBandNames: error reading tiff file " +
+                    tiffFile)
+        return bandNames
+
+    def hasComponent(self, myType):
+        """ True if component myType has data, is pending or is computed """
+        if myType in self.pendingFiles or myType in self.lazyMagnitudes:
+            return True
+        myArray = self.__dict__.get(myType)
+        return isinstance(myArray, np.ndarray) and myArray.size > 0
+
     def getWKT_PROJ(self, epsgCode, wktFile):
         ''' get wkt'''
         if epsgCode is None and wktFile is None:
@@ -245,8 +700,11 @@ class geoimage:
             return fp.readline()
 
     def imageSize(self):
-        typeDict = {'scalar': self.x, 'velocity': self.vx, 'error': self.ex}
-        ny, nx = typeDict[self.geoType].shape
+        myType = {'scalar': 'x', 'velocity': 'vx', 'error': 'ex'}[self.geoType]
+        # use geodat size for components that have not been read
+        if myType in self.pendingFiles:
+            return self.geo.sizeInPixels()
+        ny, nx = getattr(self, myType).shape
         return nx, ny
 
     def computePixEdgeCornersXYM(self):
@@ -279,114 +737,230 @@ class geoimage:
     def writeMyTiff(self, tiffFile, epsg=None, noDataDefault=None,
                     predictor='YES', noV=False, overviews=None,
                     driverName='COG', wktFile=None, computeStats=True,
-                    resampling='AVERAGE', bigTiff=False):
+                    resampling='AVERAGE', bigTiff=False, parallel=False,
+                    numThreads=None, profile=None, multiBand=False,
+                    interleave='PIXEL'):
         """ write a geotiff file  - NEEDS MODIFICATION FOR EPSG AND VX,EX
             Note: tiffFile should not have a ".tif" extension - one will be
             added.
             overviews should be of form [2, 4...]
+            parallel=True writes the components concurrently on threads
+            (GDAL releases the GIL), numThreads (e.g., 4 or 'ALL_CPUS') is
+            passed to GDAL for multithreaded compression
+            profile = name from tiffProfiles (e.g., 'balanced') to set the
+            compression, level, predictor and block size (default LZW)
+            multiBand=True writes one tiffFile.tif with the components (vx,
+            vy, v, and ex, ey if present) as named bands, with interleave
+            'PIXEL' (all components per tile) or 'BAND'
         """
         # define various set up stuff
         suffixDict = {'scalar': [''], 'velocity': ['.vx', '.vy', '.v'],
                       'error': ['.ex', '.ey']}
-        typeDict = {'scalar': self.x, 'velocity': self.vx, 'error': self.ex}
+        typeDict = {'scalar': 'x', 'velocity': 'vx', 'error': 'ex'}
         # predictor = [int(predictor), 1][predictor > 3 or predictor < 1]
         if wktFile is None:
             epsg = [epsg, 3413][epsg is None]
         try:
             suffixes = suffixDict[self.geoType]
             gdalType = gdal_array.NumericTypeCodeToGDALTypeCode(
-                typeDict[self.geoType].dtype)
+                self.componentRows(typeDict[self.geoType], 0, 1).dtype)
         except Exception:
             myerror('writeMyTiff: invalid geoType ' + self.geoType)
         #
+        # skip .v if requested
+        if noV:
+            suffixes = [x for x in suffixes if x != '.v']
+        if multiBand:
+            bands = [{'': 'x'}.get(x, x.replace('.', ''))
+                     for x in suffixes]
+            if self.geoType == 'velocity':
+                bands += [x for x in ['ex', 'ey'] if self.hasComponent(x)]
+            suffixes = ['']
+        else:
+            bands = None
+
+        def writeSuffix(suffix):
+            self.writeCloudOptGeo(tiffFile, suffix, epsg, gdalType,
+                                  overviews=overviews, predictor=predictor,
+                                  noDataDefault=noDataDefault,
+                                  driverName=driverName, wktFile=wktFile,
+                                  computeStats=computeStats,
+                                  resampling=resampling, bigTiff=bigTiff,
+                                  numThreads=numThreads, profile=profile,
+                                  bands=bands, interleave=interleave)
         try:
             # Loop through different components, also write vmag for velocity
-            for suffix in suffixes:
-                # skip .v if requested
-                if noV and suffix == '.v':
-                    continue
-                # write the geotiff
-                self.writeCloudOptGeo(tiffFile, suffix, epsg, gdalType,
-                                      overviews=overviews, predictor=predictor,
-                                      noDataDefault=noDataDefault,
-                                      driverName=driverName, wktFile=wktFile,
-                                      computeStats=computeStats,
-                                      resampling=resampling, bigTiff=bigTiff)
+            if parallel and len(suffixes) > 1:
+                with ThreadPoolExecutor(max_workers=len(suffixes)) as pool:
+                    list(pool.map(writeSuffix, suffixes))
+            else:
+                for suffix in suffixes:
+                    writeSuffix(suffix)
         except Exception:
             myerror(f"geoimage.writeMyTiff: error writing file {tiffFile}")
 
     def writeCloudOptGeo(self, tiffFile, suffix, epsg, gdalType,
                          overviews=None, predictor='YES', noDataDefault=None,
                          bigTiff=False, driverName='COG', wktFile=None,
-                         computeStats=True, resampling='AVERAGE'):
+                         computeStats=True, resampling='AVERAGE',
+                         numThreads=None, blockSize=512, profile=None,
+                         bands=None, interleave='PIXEL'):
         ''' write a cloudoptimized geotiff with overviews.
-        Set format to GTiff for a plain geotiff '''
+        Set format to GTiff for a plain geotiff. numThreads sets GDAL's
+        NUM_THREADS for multithreaded compression. profile selects a
+        tiffProfiles entry, otherwise LZW with predictor.
+        Rows are streamed (flipped and with nan->nodata in a scratch buffer)
+        into a temporary tiled tiff, so the data are never copied in full
+        or modified, and lazy components are read a strip at a time.
+        Overviews are built from the temporary file, which is then copied
+        to the final layout.
+        bands=[names] writes those components to one file as named bands,
+        interleaved by 'PIXEL' or 'BAND', with a common nodata of -2e9. '''
 
         if driverName not in ['COG', 'GTiff']:
             myerror(f'invalid driver for writeCloudOptGeo {driverName}')
-        # no data info
-        noData = {'.vx': -2.0e9, '.vy': -2.0e9, '.v': -1.0,
-                  '.ex': -1.0, '.ey': -1.0, '': noDataDefault}[suffix]
+        if profile is not None:
+            if profile not in tiffProfiles:
+                myerror(f'invalid profile {profile} not in '
+                        f'{list(tiffProfiles)}')
+            blockSize = tiffProfiles[profile]['blockSize']
+        if interleave not in ['PIXEL', 'BAND']:
+            myerror(f'invalid interleave {interleave} not PIXEL or BAND')
+        # no data info - tiff has one nodata value for all bands
+        if bands is None:
+            noData = {'.vx': -2.0e9, '.vy': -2.0e9, '.v': -1.0,
+                      '.ex': -1.0, '.ey': -1.0, '': noDataDefault}[suffix]
+            myTypes = [{'': 'x'}.get(suffix, suffix.replace('.', ''))]
+        else:
+            noData, myTypes = -2.0e9, bands
         #
-        # use a temp mem driver for CO geo
-        driver = gdal.GetDriverByName("MEM")
+        # use a temp tiled tiff for CO geo
         nx, ny = self.imageSize()
         dx, dy = self.geo.pixSizeInM()
-        dst_ds = driver.Create('', nx, ny, 1, gdalType)
-        # set geometry
-        tiffCorners = self.computePixEdgeCornersXYM()
-        dst_ds.SetGeoTransform((tiffCorners['ul']['x'], dx, 0,
-                                tiffCorners['ul']['y'], 0, -dy))
-        # set projection
-        wkt = self.getWKT_PROJ(epsg, wktFile)
-        #
-        dst_ds.SetProjection(wkt)
-        # set nodata
-        if noData is not None:
-            if self.geoType == 'scalar':
-                tmp = self.x
-            else:  # vx, vy etc
-                tmp = getattr(self, suffix.replace('.', ''))
-            tmp[np.isnan(tmp)] = noData
-            dst_ds.GetRasterBand(1).SetNoDataValue(noData)
-        # write data
-        if self.geoType == 'scalar':
-            dst_ds.GetRasterBand(1).WriteArray(np.flipud(self.x))
+        tmpFile = f'{tiffFile}{suffix}.tmp.tif'
+        driver = gdal.GetDriverByName('GTiff')
+        dst_ds = driver.Create(tmpFile, nx, ny, len(myTypes), gdalType,
+                               options=['TILED=YES', 'BIGTIFF=IF_SAFER',
+                                        f'BLOCKXSIZE={blockSize}',
+                                        f'BLOCKYSIZE={blockSize}',
+                                        f'INTERLEAVE={interleave}'])
+        try:
+            # set geometry
+            tiffCorners = self.computePixEdgeCornersXYM()
+            dst_ds.SetGeoTransform((tiffCorners['ul']['x'], dx, 0,
+                                    tiffCorners['ul']['y'], 0, -dy))
+            # set projection
+            wkt = self.getWKT_PROJ(epsg, wktFile)
+            #
+            dst_ds.SetProjection(wkt)
+            tiffBands = [dst_ds.GetRasterBand(i + 1)
+                         for i in range(len(myTypes))]
+            for band, myType in zip(tiffBands, myTypes):
+                # set nodata
+                if noData is not None:
+                    band.SetNoDataValue(noData)
+                if bands is not None:
+                    band.SetDescription(myType)
+            # write data top down, one strip of tiles (all bands) at a time
+            scratch = None
+            for j0 in range(0, ny, blockSize):
+                j1 = min(j0 + blockSize, ny)
+                for band, myType in zip(tiffBands, myTypes):
+                    strip = self.componentRows(myType, ny - j1, ny - j0)
+                    if scratch is None:
+                        scratch = np.empty((blockSize, nx),
+                                           dtype=strip.dtype)
+                    buf = scratch[0:j1 - j0]
+                    np.copyto(buf, strip[::-1])
+                    if noData is not None and \
+                            np.issubdtype(buf.dtype, np.floating):
+                        buf[np.isnan(buf)] = noData
+                    band.WriteArray(buf, 0, j0)
+            # compute statistics, which should embed in file.
+            if computeStats:
+                for band in tiffBands:
+                    _ = band.GetStatistics(0, 1)
+            #
+            bigTiffFlag = ["NO", "YES"][bigTiff]
+            options = [f'BIGTIFF={bigTiffFlag}']
+            if bands is not None:
+                options.append(f'INTERLEAVE={interleave}')
+            options += self.compressOptions(driverName, scratch.dtype,
+                                            profile, predictor)
+            if numThreads is not None:
+                options.append(f'NUM_THREADS={numThreads}')
+            # driver specific stuff
+            if driverName == 'GTiff':  # GTiff options
+                options += ['TILED=YES', f'BLOCKXSIZE={blockSize}',
+                            f'BLOCKYSIZE={blockSize}']
+                if overviews is not None:
+                    if len(overviews) < 2:
+                        myerror(f'Overviews {overviews} should be [2, 4, ..])')
+                    options.append('COPY_SRC_OVERVIEWS=YES')
+                    # built from the file, a level at a time
+                    dst_ds.BuildOverviews(resampling, overviews)
+            else:  # COG OPTIONS
+                options.append('GEOTIFF_VERSION=1.1')
+                options.append(f'BLOCKSIZE={blockSize}')
+                options.append(f'RESAMPLING={resampling}')
+            #
+            # now copy to a geotiff - temp -> geotiff forces correct order
+            # for c opt geotiff
+            dst_ds.FlushCache()
+            driver = gdal.GetDriverByName(driverName)
+            # Create copy for the COG.
+            dst_ds2 = driver.CreateCopy(f'{tiffFile}{suffix}.tif', dst_ds,
+                                        options=options)
+            dst_ds2.FlushCache()
+        finally:
+            # close and remove temp file
+            dst_ds, dst_ds2 = None, None
+            gdal.GetDriverByName('GTiff').Delete(tmpFile)
+
+    def compressOptions(self, driverName, dtype, profile, predictor):
+        """ GDAL creation options for compression, level and predictor.
+        Without a profile use LZW and predictor ('YES', 'NO' or 1-3). 'YES'
+        gives floating point prediction (3) for float data and horizontal
+        (2) otherwise """
+        if profile is not None:
+            compress = tiffProfiles[profile]['compress']
+            level = tiffProfiles[profile]['level']
+            predictor = tiffProfiles[profile]['predictor']
         else:
-            dst_ds.GetRasterBand(1).WriteArray(
-                np.flipud(getattr(self, suffix.replace('.', ''))))
-        # compute statistics, which should embed in file.
-        if computeStats:
-            _ = dst_ds.GetRasterBand(1).GetStatistics(0, 1)
-        #
-        bigTiffFlag = ["NO", "YES"][bigTiff]
-        options = [f'BIGTIFF={bigTiffFlag}', 'COMPRESS=LZW']
-        # driver specific stuff
-        if driverName == 'GTiff':  # GTiff options
-            if type(predictor) != int and predictor is not None:
-                options.append(f'PREDICTOR={1}')
-            if overviews is not None:
-                if len(overviews) < 2:
-                    myerror(f'Overviews {overviews} should be [2, 4, ..])')
-                options.append('COPY_SRC_OVERVIEWS=YES')
-                dst_ds.BuildOverviews(resampling, overviews)
-        else:  # COG OPTIONS
-            options.append('GEOTIFF_VERSION=1.1')
-            options.append('GEOTIFF_VERSION=1.1')
-            options.append(f'RESAMPLING={resampling}')
-            if predictor in ['YES', 'NO']:
-                options.append(f'PREDICTOR={predictor}')
-        #
-        # now copy to a geotiff - mem -> geotiff forces correct order
-        # for c opt geotiff
-        dst_ds.FlushCache()
-        driver = gdal.GetDriverByName(driverName)
-        # Create copy for the COG.
-        dst_ds2 = driver.CreateCopy(f'{tiffFile}{suffix}.tif', dst_ds,
-                                    options=options)
-        dst_ds2.FlushCache()
-        # free memory
-        dst_ds, dst_ds2 = None, None
+            compress, level = 'LZW', None
+        # resolve predictor to 1, 2 or 3
+        if predictor in [None, False, 'NO']:
+            predictor = 1
+        elif predictor in [True, 'YES']:
+            predictor = [2, 3][np.issubdtype(dtype, np.floating)]
+        predictor = int(predictor)
+        options = [f'COMPRESS={compress}']
+        if driverName == 'COG':
+            options.append('PREDICTOR=' + {1: 'NO', 2: 'STANDARD',
+                                           3: 'FLOATING_POINT'}[predictor])
+            if level is not None:
+                options.append(f'LEVEL={level}')
+        else:
+            options.append(f'PREDICTOR={predictor}')
+            if level is not None:
+                levelName = {'ZSTD': 'ZSTD_LEVEL', 'DEFLATE': 'ZLEVEL'}
+                options.append(f'{levelName[compress]}={level}')
+        return options
+
+    def componentRows(self, myType, r0, r1):
+        """ return rows r0:r1 of a component, reading only those rows if it
+        has not been loaded yet and computing v/e for just those rows """
+        if myType in self.__dict__:
+            return self.__dict__[myType][r0:r1]
+        if myType in self.pendingFiles:
+            nx = self.geo.sizeInPixels()[0]
+            return self.readComponent(myType, ((r0, r1), (0, nx)))
+        if myType in self.lazyMagnitudes:
+            xName, yName = self.lazyMagnitudes[myType]
+            cx = self.componentRows(xName, r0, r1)
+            cy = self.componentRows(yName, r0, r1)
+            return np.hypot(cx, cy, dtype=self.magnitudeType(cx, cy))
+        return getattr(self, myType)[r0:r1]
 
     def getDomain(self, epsg):
         if epsg is None or epsg == 3413:
@@ -450,63 +1024,237 @@ class geoimage:
 #        print(fileNames)
         return fileNames
 
-    def readFiles(self, fileNames, dType, tiff=False):
+    def readFiles(self, fileNames, dType, tiff=False, window=None,
+                  lazy=False, decimation=1, bands=None):
+        """ read the components (x, vx/vy, or ex/ey) from fileNames. If lazy,
+        each component is read on first access. v or e are computed on
+        access (cached if self.cacheMagnitude). window is in full resolution
+        pixels and should be a multiple of decimation in size.
+        bands={component: band} reads the components from the multi-band
+        tiff fileNames[0], in one pass if not lazy """
         #  get the values that match the type
-        myTypes = {'scalar': ['x'], 'velocity': ['vx', 'vy'],
-                   'error': ['ex', 'ey']}[self.geoType]
-        minValue = {'scalar': -2.e9, 'velocity': -2.e9,
-                    'error': -2.e9}[self.geoType]
+        if bands is None:
+            myTypes = {'scalar': ['x'], 'velocity': ['vx', 'vy'],
+                       'error': ['ex', 'ey']}[self.geoType]
+            sources = [(x, y, None) for x, y in zip(myTypes, fileNames)]
+        else:
+            sources = [(x, fileNames[0], y) for x, y in bands.items()]
         sx, sy = self.geo.sizeInPixels()
+        # new data, so drop interpolation coefficients
+        self.splineCoeffs = {}
         # loop over arrays and file names to read data
-        for myType, fileName in zip(myTypes, fileNames):
-            if not tiff:
-                # print(fileName, sx, sy, dType)
-                myArray = readImage(fileName, sx, sy, dType)
-            else:
-                myArray = self.readMyTiff(fileName)
-            # handle no data nans if present
-            if np.sum(np.isnan(myArray)) > 0:
-                myArray[np.isnan(myArray)] = np.nan
-            elif isinstance(myArray[0, 0], np.floating):
-                # print(minValue)
-                myArray[myArray <= minValue] = np.nan
-            setattr(self, myType, myArray)
+        for myType, fileName, band in sources:
+            self.pendingFiles[myType] = (fileName, sx, sy, dType, tiff,
+                                         window, decimation, band)
+            self.__dict__.pop(myType, None)
+            if not lazy and bands is None:
+                self.loadComponent(myType)
+        if not lazy and bands is not None:
+            self.loadBands(list(bands))
         #
-        # compute mag for velocity and errors
-        if self.geoType == 'velocity':
-            self.v = np.sqrt(np.square(self.vx.astype(float)) +
-                             np.square(self.vy.astype(float)))
-        elif self.geoType == 'error':
-            self.e = np.sqrt(np.square(self.ex) + np.square(self.ey))
+        # setup mag for velocity and errors
+        self.lazyMagnitudes = {'velocity': {'v': ('vx', 'vy')},
+                               'error': {'e': ('ex', 'ey')},
+                               'scalar': {}}[self.geoType]
+        # errors stored with velocities in a multi-band file
+        if bands is not None and self.geoType == 'velocity' and \
+                'ex' in bands and 'ey' in bands:
+            self.lazyMagnitudes['e'] = ('ex', 'ey')
+        for myType in self.lazyMagnitudes:
+            self.__dict__.pop(myType, None)
+
+    def loadComponent(self, myType):
+        """ read a component set up by readFiles and keep it """
+        myArray = self.readComponent(myType)
+        setattr(self, myType, myArray)
+        del self.pendingFiles[myType]
+        return myArray
+
+    def loadBands(self, myTypes):
+        """ read components set up by readFiles from the bands of one
+        multi-band tiff in a single pass and keep them """
+        fileName, sx, sy, dType, tiff, window, decimation, _ = \
+            self.pendingFiles[myTypes[0]]
+        bands = [self.pendingFiles[x][-1] for x in myTypes]
+        arr = self.readMyTiff(fileName, window=window, decimation=decimation,
+                              bands=bands)
+        for myType, myArray in zip(myTypes, arr):
+            setattr(self, myType, self.noDataToNan(myArray))
+            del self.pendingFiles[myType]
+
+    def noDataToNan(self, myArray):
+        """ set no data to nan """
+        minValue = -2.e9
+        # handle no data nans if present
+        if np.sum(np.isnan(myArray)) > 0:
+            myArray[np.isnan(myArray)] = np.nan
+        elif isinstance(myArray[0, 0], np.floating):
+            # print(minValue)
+            myArray[myArray <= minValue] = np.nan
+        return myArray
+
+    def readComponent(self, myType, subWindow=None):
+        """ read a component set up by readFiles, optionally only subWindow
+        ((r0, r1), (c0, c1)) of the current geodat, and set no data to nan
+        """
+        fileName, sx, sy, dType, tiff, window, decimation, band = \
+            self.pendingFiles[myType]
+        # scale subWindow to full resolution and offset it by any window
+        # applied when the data were setup
+        if subWindow is not None:
+            (r0, r1), (c0, c1) = [(decimation * i0, decimation * i1)
+                                  for i0, i1 in subWindow]
+            if window is not None:
+                r0, r1 = r0 + window[0][0], r1 + window[0][0]
+                c0, c1 = c0 + window[1][0], c1 + window[1][0]
+            window = ((r0, r1), (c0, c1))
+        if not tiff:
+            # print(fileName, sx, sy, dType)
+            myArray = readImage(fileName, sx, sy, dType, window=window,
+                                decimation=decimation)
+        elif band is None:
+            myArray = self.readMyTiff(fileName, window=window,
+                                      decimation=decimation)
+        else:
+            myArray = self.readMyTiff(fileName, window=window,
+                                      decimation=decimation, bands=[band])[0]
+        return self.noDataToNan(myArray)
+
+    def multiBandComponents(self, tiffFile):
+        """ {component: band} for the components of this geoType in a
+        multi-band tiff (velocity also picks up ex, ey if present) """
+        bandNames = self.tiffBandNames(tiffFile)
+        required = {'scalar': ['x'], 'velocity': ['vx', 'vy'],
+                    'error': ['ex', 'ey']}[self.geoType]
+        optional = {'velocity': ['ex', 'ey']}.get(self.geoType, [])
+        missing = [x for x in required if x not in bandNames]
+        if len(missing) > 0:
+            myerror(f'geoimage.readData: {tiffFile} missing bands {missing}'
+                    f' has {list(bandNames)}')
+        return {x: bandNames[x] for x in required + optional
+                if x in bandNames}
+
+    def decimationFactor(self, decimation, pixelSize):
+        """ integer decimation from decimation or a target pixelSize (m) """
+        if pixelSize is not None:
+            decimation = pixelSize / self.geo.dx
+        if decimation is None:
+            return 1
+        decimation = max(int(round(decimation)), 1)
+        if decimation > min(self.geo.xs, self.geo.ys):
+            myerror(f'geoimage: decimation {decimation} larger than image '
+                    f'{self.geo.xs} x {self.geo.ys}')
+        return decimation
+
+    def decimateWindow(self, window, decimation):
+        """ full image if window is None, trimmed so each dimension is a
+        multiple of decimation """
+        if window is None:
+            window = ((0, self.geo.ys), (0, self.geo.xs))
+        (r0, r1), (c0, c1) = window
+        r1 = r0 + (r1 - r0) // decimation * decimation
+        c1 = c0 + (c1 - c0) // decimation * decimation
+        if r1 <= r0 or c1 <= c0:
+            myerror(f'geoimage: window {window} smaller than decimation '
+                    f'{decimation}')
+        return (r0, r1), (c0, c1)
+
+    def magnitudeType(self, cx, cy):
+        """ dtype for v or e - the component dtype (at least float32, and
+        only float32 with that precision) """
+        if getFloatType() == np.float32:
+            return np.float32
+        return np.result_type(cx.dtype, cy.dtype, np.float32)
+
+    def computeMagnitude(self, myType, blockRows=512):
+        """ compute v or e from its components in row blocks, kept if
+        self.cacheMagnitude and otherwise returned read only """
+        xName, yName = self.lazyMagnitudes[myType]
+        cx, cy = getattr(self, xName), getattr(self, yName)
+        mag = np.empty(cx.shape, dtype=self.magnitudeType(cx, cy))
+        for i in range(0, cx.shape[0], blockRows):
+            np.hypot(cx[i:i + blockRows], cy[i:i + blockRows],
+                     out=mag[i:i + blockRows])
+        if self.cacheMagnitude:
+            setattr(self, myType, mag)
+        else:
+            # a new array on each access, so make edits fail loudly
+            mag.flags.writeable = False
+        return mag
 
     # -------------------------------------------------------------------------
     # read geo image data
     # -------------------------------------------------------------------------
     def readData(self, fileName, geoType=None, geoFile=None, dType='>f4',
-                 tiff=False, epsg=None, vxMod=None, wktFile=None):
+                 tiff=False, epsg=None, vxMod=None, wktFile=None,
+                 window=None, bbox=None, lazy=False, cacheMagnitude=None,
+                 windowed=False, windowCacheSize=8, decimation=None,
+                 pixelSize=None, multiBand=False):
         """ read Data for geo image
         fileName=filename (or basename if velocity )
         geoType =specify read 'velocity' or 'scalar' data
         geoFile=geodatfile [fileName(.vx).geodat]
         dType=type for scalar ['>f4']   ( 'f4','>f4','>u2','u2',
-        'u1','>i2','i2','>u4','u4','>i4','i4')"""
+        'u1','>i2','i2','>u4','u4','>i4','i4')
+        window=((r0, r1), (c0, c1)) pixel rows/columns to read, or
+        bbox=(xmin, ymin, xmax, ymax) in km - geodat is cut to match
+        lazy=True defers reading each component until it is first used
+        v/e are computed on first access and kept, unless cacheMagnitude=
+        False, which is the default for lazy/windowed reads, where they are
+        recomputed (read only) on each access
+        windowed=True never reads the full image for interpGeo, which reads
+        just the window around the query points (the last windowCacheSize
+        windows are kept for reuse)
+        decimation=k or pixelSize (m) reads a k times coarser image, using
+        the tiff overviews when present (every kth pixel for binary files),
+        and scales geodat to match
+        multiBand=True reads fileName.tif written by writeMyTiff(multiBand=
+        True), loading vx, vy (and ex, ey if present) in one pass"""
         #
         # error check type
         if geoType is not None:
             self.setGeoType(geoType)
         #
+        # multi-band products are a single tiff
+        if multiBand:
+            tiff = True
+            if geoFile is None:
+                geoFile = fileName + '.tif'
         # read geodat
         wkt = self.getWKT_PROJ(epsg, wktFile)
         geoFile = self.getGeoFile(fileName, self.getDomain(epsg), wkt=wkt,
                                   geoFile=geoFile, tiff=tiff, vxMod=vxMod)
-        # compute coordinates for data
-        self.xyCoordinates()
-        # get size
-        sx, sy = self.geo.sizeInPixels()
+        # get window for subregion reads
+        if bbox is not None:
+            window = self.geo.kmBoundsToWindow(*bbox)
+        decimation = self.decimationFactor(decimation, pixelSize)
+        if decimation > 1:
+            window = self.decimateWindow(window, decimation)
         # read image (set no data to nan)
         fileNames = self.dataFileNames(fileName, tiff=tiff, vxMod=vxMod)
+        bands = None
+        if multiBand:
+            fileNames = [geoFile]
+            bands = self.multiBandComponents(geoFile)
         # print(fileNames)
-        self.readFiles(fileNames, dType, tiff=tiff)
+        if cacheMagnitude is None:
+            cacheMagnitude = not (lazy or windowed)
+        self.cacheMagnitude = cacheMagnitude
+        self.windowed = windowed
+        self.windowCache = OrderedDict()
+        self.windowCacheSize = windowCacheSize
+        self.readFiles(fileNames, dType, tiff=tiff, window=window,
+                       lazy=lazy or windowed, decimation=decimation,
+                       bands=bands)
+        # trim geodat to the window
+        if window is not None:
+            self.geo.applyWindow(window)
+        # tiffs are block averaged, binary files sampled k//2 into each block
+        if decimation > 1:
+            self.geo.decimate(decimation,
+                              offset=None if tiff else decimation // 2)
+        # compute coordinates for data
+        self.xyCoordinates()
 
 # -------------------------------------------------------------------------
 # read geo image data
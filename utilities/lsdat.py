@@ -1,8 +1,8 @@
 # lsdat.py
 import numpy as np
-import pyproj
 from datetime import datetime, timedelta
 from utilities import myerror, mywarning
+from utilities.projCache import getProj, getTransformer
 
 
 class lsdat:
@@ -45,19 +45,25 @@ class lsdat:
                 exit()
         #
         # setup conversions
-        # This step is time consuming, so opt out if not needed.
-        if not noProjection:
-            self.llproj = pyproj.Proj("EPSG:4326")
-            if self.domain == 3413:
-                self.xyproj = pyproj.Proj("EPSG:3413")
-            elif self.domain == 3031:
-                self.xyproj = pyproj.Proj("EPSG:3031")
-            self.llxyXform = pyproj.Transformer.from_crs("EPSG:4326",
-                                                         f'EPSG:{self.domain}')
-            self.xyllXform = pyproj.Transformer.from_crs(f'EPSG:{self.domain}',
-                                                         "EPSG:4326")
+        # Projections come from the projCache on first use (see __getattr__),
+        # so noProjection no longer has to be set to skip the setup cost.
 #        print('setting up projections', self.domain)
 
+    def __getattr__(self, name):
+        """ llproj, xyproj, llxyXform and xyllXform from the per thread
+        projCache for the current domain (EPSG code) """
+        if name not in ['llproj', 'xyproj', 'llxyXform', 'xyllXform'] or \
+                'domain' not in self.__dict__:
+            raise AttributeError(f"'lsdat' object has no attribute '{name}'")
+        xySRS = f'EPSG:{self.__dict__["domain"]}'
+        if name == 'llproj':
+            return getProj("EPSG:4326")
+        if name == 'xyproj':
+            return getProj(xySRS)
+        if name == 'llxyXform':
+            return getTransformer("EPSG:4326", xySRS)
+        return getTransformer(xySRS, "EPSG:4326")
+
     def lltoxym(self, lat, lon, scale=None):
         """ lat, lon is an nparray of xy points in units of km, output is x,y
         in meters """
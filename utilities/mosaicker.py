@@ -0,0 +1,314 @@
+# mosaicker.py
+import numpy as np
+import os
+import threading
+import multiprocessing
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from utilities.geodat import geodat
+from utilities.geoimage import geoimage
+from utilities.myerror import myerror
+
+# components composited for each geoType, and the errors used as weights
+mosaicComponents = {'scalar': ['x'], 'velocity': ['vx', 'vy'],
+                    'error': ['ex', 'ey']}
+weightComponents = {'velocity': ['ex', 'ey'], 'error': ['ex', 'ey']}
+mosaicModes = ['first', 'last', 'mean', 'weighted']
+# locks for worker processes, set by the pool initializer. Tiles share
+# locks round robin when there are more tiles than maxLocks
+tileLocks = []
+maxLocks = 256
+
+
+def setTileLocks(locks):
+    """ install the tile locks in a worker process """
+    tileLocks[:] = locks
+
+
+class mosaicker:
+
+    """ mosaicker - composite geoimage files onto a common geodat grid """
+
+    def __init__(self, geo, geoType='velocity', mode='mean', workDir=None,
+                 tileSize=1024, dtype=np.float32, verbose=True):
+        """ mosaicker(geo) composites onto the grid of geodat geo.
+        mode: first/last - value from the first/last file (by list order)
+        mean - average of the valid values
+        weighted - weighted by 1/error**2, which also gives the error of
+        the result (velocity and error only)
+        workDir - keep the results in memmapped files in workDir, which
+        allows mosaic to use a process pool. Otherwise arrays are kept in
+        memory and workers are threads """
+        if mode not in mosaicModes:
+            myerror(f'mosaicker: invalid mode {mode} not in {mosaicModes}')
+        if geoType not in mosaicComponents:
+            myerror(f'mosaicker: invalid geoType {geoType}')
+        if mode == 'weighted' and geoType not in weightComponents:
+            myerror('mosaicker: weighted mode needs velocity or error data')
+        self.geoType, self.mode = geoType, mode
+        self.components = mosaicComponents[geoType]
+        # keep grid as plain values so workers can be sent self
+        self.grid = (geo.x0, geo.y0, geo.xs, geo.ys, geo.dx, geo.dy)
+        self.domain, self.wkt = geo.domain, geo.xyprojSRS
+        self.tileSize, self.dtype = tileSize, dtype
+        self.workDir, self.verbose = workDir, verbose
+        self.arrays, self.locks = None, None
+        self.createAccumulators()
+
+    # -------------------------------------------------------------------------
+    # Accumulators - values, or sums, plus priority, counts or weights
+    # -------------------------------------------------------------------------
+    def accumulatorNames(self):
+        """ names of the arrays used for this mode """
+        if self.mode in ['first', 'last']:
+            return self.components + ['priority']
+        if self.mode == 'mean':
+            return self.components + ['count']
+        return self.components + [x + '.w' for x in self.components]
+
+    def accumulatorFill(self, name):
+        """ dtype and initial value for an accumulator """
+        if name == 'priority':
+            start = {'first': np.iinfo(np.int32).max, 'last': -1}
+            return np.int32, start[self.mode]
+        if name == 'count':
+            return np.int32, 0
+        if self.mode in ['first', 'last']:
+            return self.dtype, np.nan
+        return self.dtype, 0
+
+    def accumulatorFile(self, name):
+        return os.path.join(self.workDir, f'mosaic.{name}')
+
+    def createAccumulators(self):
+        """ preallocate the accumulators in memory or as memmapped files """
+        shape = (self.grid[3], self.grid[2])
+        if self.workDir is None:
+            self.arrays = {}
+            for name in self.accumulatorNames():
+                dtype, fill = self.accumulatorFill(name)
+                self.arrays[name] = np.full(shape, fill, dtype=dtype)
+            return
+        os.makedirs(self.workDir, exist_ok=True)
+        for name in self.accumulatorNames():
+            dtype, fill = self.accumulatorFill(name)
+            x = np.memmap(self.accumulatorFile(name), dtype=dtype,
+                          mode='w+', shape=shape)
+            # new files are zero filled
+            if fill != 0:
+                for r0 in range(0, shape[0], self.tileSize):
+                    x[r0:r0 + self.tileSize] = fill
+            x.flush()
+
+    def accumulators(self):
+        """ return {name: array} of the accumulators """
+        if self.arrays is not None:
+            return self.arrays
+        shape = (self.grid[3], self.grid[2])
+        return {name: np.memmap(self.accumulatorFile(name),
+                                dtype=self.accumulatorFill(name)[0],
+                                mode='r+', shape=shape)
+                for name in self.accumulatorNames()}
+
+    # -------------------------------------------------------------------------
+    # Geometry
+    # -------------------------------------------------------------------------
+    def overlap(self, geo):
+        """ return the target window ((r0, r1), (c0, c1)) covered by geodat
+        geo and the (row, column) offset of geo in the target, or None if
+        they do not overlap """
+        x0, y0, xs, ys, dx, dy = self.grid
+        gdx, gdy = geo.pixSizeInKm()
+        if abs(gdx - dx * 0.001) > 1e-6 * gdx or \
+                abs(gdy - dy * 0.001) > 1e-6 * gdy:
+            myerror(f'mosaicker: pixel size {geo.dx}, {geo.dy} does not match'
+                    f' mosaic {dx}, {dy}')
+        gx0, gy0 = geo.originInKm()
+        cOff, rOff = (gx0 - x0) / gdx, (gy0 - y0) / gdy
+        if abs(cOff - round(cOff)) > 1e-3 or abs(rOff - round(rOff)) > 1e-3:
+            myerror(f'mosaicker: origin {gx0}, {gy0} is not on the mosaic '
+                    'grid')
+        cOff, rOff = int(round(cOff)), int(round(rOff))
+        c0, c1 = max(cOff, 0), min(cOff + geo.xs, xs)
+        r0, r1 = max(rOff, 0), min(rOff + geo.ys, ys)
+        if c1 <= c0 or r1 <= r0:
+            return None
+        return ((r0, r1), (c0, c1)), (rOff, cOff)
+
+    def tiles(self, window):
+        """ yield (tile number, (r0, r1), (c0, c1)) for the pieces of window
+        in each tile """
+        (r0, r1), (c0, c1) = window
+        ts = self.tileSize
+        nTileX = (self.grid[2] + ts - 1) // ts
+        for rt in range(r0 // ts * ts, r1, ts):
+            for ct in range(c0 // ts * ts, c1, ts):
+                yield (rt // ts) * nTileX + ct // ts, \
+                    (max(rt, r0), min(rt + ts, r1)), \
+                    (max(ct, c0), min(ct + ts, c1))
+
+    def tileLock(self, tile):
+        """ lock for a tile (no lock if running serially) """
+        locks = self.locks if self.locks is not None else tileLocks
+        if len(locks) == 0:
+            return nullcontext()
+        return locks[tile % len(locks)]
+
+    # -------------------------------------------------------------------------
+    # Composite
+    # -------------------------------------------------------------------------
+    def readWindow(self, myImage, myType, window):
+        """ read window ((r0, r1), (c0, c1)) of a component """
+        if myType in myImage.pendingFiles:
+            return myImage.readComponent(myType, window)
+        (r0, r1), (c0, c1) = window
+        return getattr(myImage, myType)[r0:r1, c0:c1]
+
+    def compositeFile(self, index, fileName, readArgs):
+        """ add file number index to the mosaic a tile at a time. readArgs
+        are passed to geoimage.readData (e.g., tiff=True). Returns True if
+        the file overlapped the mosaic """
+        myImage = geoimage(verbose=False)
+        myImage.readData(fileName, geoType=self.geoType, lazy=True,
+                         **readArgs)
+        windows = self.overlap(myImage.geo)
+        if windows is None:
+            return False
+        window, (rOff, cOff) = windows
+        # errors for weights, from the same file if it has them
+        errImage, errTypes = myImage, weightComponents.get(self.geoType, [])
+        if self.mode == 'weighted' and \
+                not all(myImage.hasComponent(x) for x in errTypes):
+            errImage = geoimage(verbose=False)
+            errImage.readData(fileName, geoType='error', lazy=True,
+                              **readArgs)
+        acc = self.accumulators()
+        wc0, wc1 = window[1]
+        rowBand = None
+        for tile, (r0, r1), (c0, c1) in self.tiles(window):
+            if rowBand != (r0, r1):
+                # read each row of tiles once and split it across its tiles
+                rowBand = (r0, r1)
+                subWindow = ((r0 - rOff, r1 - rOff), (wc0 - cOff, wc1 - cOff))
+                rowValues = [self.readWindow(myImage, x, subWindow)
+                             for x in self.components]
+                if self.mode == 'weighted':
+                    rowErrors = [self.readWindow(errImage, x, subWindow)
+                                 for x in errTypes]
+            cols = slice(c0 - wc0, c1 - wc0)
+            values = [x[:, cols] for x in rowValues]
+            valid = np.all([np.isfinite(x) for x in values], axis=0)
+            weights = None
+            if self.mode == 'weighted':
+                errors = [x[:, cols] for x in rowErrors]
+                valid &= np.all([x > 0 for x in errors], axis=0)
+                weights = [np.where(valid, 1. / np.where(valid, x, 1.)**2, 0)
+                           for x in errors]
+            with self.tileLock(tile):
+                self.accumulate(acc, index, (slice(r0, r1), slice(c0, c1)),
+                                values, weights, valid)
+        for x in acc.values():
+            if isinstance(x, np.memmap):
+                x.flush()
+        if self.verbose:
+            print(f'mosaicker: added {fileName}')
+        return True
+
+    def accumulate(self, acc, index, region, values, weights, valid):
+        """ add values to the accumulators in region (with the tile lock) """
+        if self.mode in ['first', 'last']:
+            priority = acc['priority'][region]
+            if self.mode == 'first':
+                update = valid & (index < priority)
+            else:
+                update = valid & (index > priority)
+            priority[update] = index
+            for myType, value in zip(self.components, values):
+                acc[myType][region][update] = value[update]
+        elif self.mode == 'mean':
+            for myType, value in zip(self.components, values):
+                acc[myType][region][valid] += value[valid]
+            acc['count'][region][valid] += 1
+        else:
+            for myType, value, w in zip(self.components, values, weights):
+                acc[myType][region][valid] += (w * value)[valid]
+                acc[myType + '.w'][region] += w
+
+    def finalize(self):
+        """ convert sums to means, and weights to errors, in place """
+        if self.mode in ['first', 'last']:
+            return
+        acc = self.accumulators()
+        for r0 in range(0, self.grid[3], self.tileSize):
+            rows = slice(r0, r0 + self.tileSize)
+            for myType in self.components:
+                total = acc[myType][rows]
+                if self.mode == 'mean':
+                    n = acc['count'][rows]
+                else:
+                    n = acc[myType + '.w'][rows]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    if self.mode == 'mean' or self.geoType == 'velocity':
+                        total[...] = np.where(n > 0, total / n, np.nan)
+                    if self.mode == 'weighted':
+                        # error of the weighted mean
+                        sigma = np.where(n > 0, 1. / np.sqrt(n), np.nan)
+                        if self.geoType == 'error':
+                            total[...] = sigma
+                        else:
+                            n[...] = sigma
+        for x in acc.values():
+            if isinstance(x, np.memmap):
+                x.flush()
+
+    def mosaic(self, fileNames, nWorkers=1, **readArgs):
+        """ composite fileNames (in priority order) and return the mosaic
+        as a geoimage. readArgs are passed to geoimage.readData. With nWorkers
+        > 1 files are composited on a process pool (workDir set) or threads,
+        with writes to each tile locked. Call once per mosaicker """
+        n = len(fileNames)
+        args = (range(n), fileNames, [readArgs] * n)
+        ts = self.tileSize
+        nTiles = ((self.grid[2] + ts - 1) // ts) * ((self.grid[3] + ts - 1)
+                                                    // ts)
+        nLocks = min(nTiles, maxLocks)
+        if nWorkers > 1 and self.workDir is not None:
+            locks = [multiprocessing.Lock() for _ in range(nLocks)]
+            with ProcessPoolExecutor(max_workers=nWorkers,
+                                     initializer=setTileLocks,
+                                     initargs=(locks,)) as pool:
+                used = list(pool.map(self.compositeFile, *args))
+        elif nWorkers > 1:
+            self.locks = [threading.Lock() for _ in range(nLocks)]
+            try:
+                with ThreadPoolExecutor(max_workers=nWorkers) as pool:
+                    used = list(pool.map(self.compositeFile, *args))
+            finally:
+                self.locks = None
+        else:
+            used = list(map(self.compositeFile, *args))
+        if self.verbose:
+            print(f'mosaicker: {sum(used)} of {n} files overlap the mosaic')
+        self.finalize()
+        return self.mosaicImage()
+
+    def mosaicImage(self):
+        """ return the mosaic as a geoimage, backed by the memmapped files if
+        workDir is set. Weighted velocity mosaics include ex, ey """
+        x0, y0, xs, ys, dx, dy = self.grid
+        myImage = geoimage(geoType=self.geoType, verbose=False)
+        myImage.geo = geodat(x0=x0, y0=y0, xs=xs, ys=ys, dx=dx, dy=dy,
+                             domain=self.domain, wkt=self.wkt, verbose=False)
+        myImage.xyCoordinates()
+        acc = self.accumulators()
+        for myType in self.components:
+            setattr(myImage, myType, acc[myType])
+        myImage.lazyMagnitudes = {'velocity': {'v': ('vx', 'vy')},
+                                  'error': {'e': ('ex', 'ey')},
+                                  'scalar': {}}[self.geoType]
+        if self.mode == 'weighted' and self.geoType == 'velocity':
+            myImage.ex, myImage.ey = acc['vx.w'], acc['vy.w']
+            myImage.lazyMagnitudes['e'] = ('ex', 'ey')
+        for myType in myImage.lazyMagnitudes:
+            myImage.__dict__.pop(myType, None)
+        return myImage
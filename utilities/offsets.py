@@ -3,11 +3,30 @@ from utilities.readImage import readImage
 from utilities.writeImage import writeImage
 from utilities import geodatrxa
 from utilities import myerror
+from utilities.floatPrecision import asFloat
 import os
 import shutil
 import ntpath
 import rasterio
 from osgeo import gdal
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+# Number of set bits in each byte value for counting packed masks
+bitCounts = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis],
+                          axis=1).sum(axis=1)
+
+# Layers for readAll/iterBlocks: variable -> (file name attribute, raw data
+# type, vrt band description)
+offsetLayers = {'azOff': ('azimuthFile', '>f4', 'AzimuthOffsets'),
+                'rgOff': ('rangeFile', '>f4', 'RangeOffsets'),
+                'sigmaA': ('sigmaAFile', '>f4', 'AzimuthSigma'),
+                'sigmaR': ('sigmaRFile', '>f4', 'RangeSigma'),
+                'cc': ('ccFile', '>f4', 'Correlation'),
+                'mask': ('maskFile', 'u1', 'Mask'),
+                'matchType': ('matchTypeFile', 'u1', 'MatchType'),
+                'lat': ('latFile', '>f8', 'lat'),
+                'lon': ('lonFile', '>f8', 'lon')}
 
 
 class offsets:
@@ -16,7 +35,7 @@ class offsets:
     def __init__(self, fileRoot=None, rangeFile=None, latlon=None,
                  datFile=None, sigmaAFile=None, sigmaRFile=None,
                  matchTypeFile=None, geodatrxaFile=None, maskFile=None,
-                 verbose=True, myPath=None, vrtFile=None):
+                 verbose=True, myPath=None, vrtFile=None, packValid=False):
         '''
         Initialize offsets - defaults to setting up for azimuth.offsets
         fileRoot = specify name to read offsets in from fileRoot
@@ -25,7 +44,8 @@ class offsets:
         latlon = read lat/lon for latlon.lat/.lon assumes path from fileRoot
         datFile = specify .dat file
         sigmaAFile/SigmaRFile = specify sigma A/R files,  otherwise guess
-        matchTypeFile = specify matchTypeFile,  otherwise guess\n
+        matchTypeFile = specify matchTypeFile,  otherwise guess
+        packValid = keep the cached valid mask bit packed\n
         Note  - this will not actually read the offsets - this must be done
         with readOffsets
         '''
@@ -53,6 +73,8 @@ class offsets:
         self.vrtFile = vrtFile
         self.vrtMatchFile = None
         self.maskVrtFile = None
+        self.validMask, self.validShape = None, None
+        self.packValid = packValid
         #
         # in most cases all or no args would be passed.
         #
@@ -158,11 +180,43 @@ class offsets:
         else:
             return fileName
 
+    def setValid(self):
+        '''
+        Build the cached valid mask from the offsets (bit packed if
+        packValid). It is kept up to date by remove/removeList, so call this
+        again only if rgOff/azOff are modified directly.
+        '''
+        valid = np.logical_and(self.rgOff > -1.99e9, self.azOff > -1.99e9)
+        self.validShape = valid.shape
+        if self.packValid:
+            valid = np.packbits(valid, axis=None)
+        self.validMask = valid
+
     def areValid(self):
-        return np.logical_and(self.rgOff > -1.99e9, self.azOff > -1.99e9)
+        '''
+        Return the valid mask (a read only view of the cached mask)
+        '''
+        if self.validMask is None or self.validShape != self.rgOff.shape:
+            self.setValid()
+        if self.packValid:
+            return np.unpackbits(self.validMask, count=np.prod(
+                self.validShape)).reshape(self.validShape).view(bool)
+        valid = self.validMask.view()
+        valid.flags.writeable = False
+        return valid
 
     def notValid(self):
-        return np.logical_or(self.rgOff < -1.99e9, self.azOff < -1.99e9)
+        return np.logical_not(self.areValid())
+
+    def nValid(self):
+        '''
+        Return the number of valid offsets
+        '''
+        if self.validMask is None or self.validShape != self.rgOff.shape:
+            self.setValid()
+        if self.packValid:
+            return int(bitCounts[self.validMask].sum())
+        return int(np.count_nonzero(self.validMask))
 
     def minmax(self, x):
         ''' generic minmax '''
@@ -269,8 +323,9 @@ class offsets:
         if len(self.lat) <= 0:
             myerror(' Could not read lat/lon - check files exist ')
 
-        # force conversion to 64 bit for coordinate transforms
-        return self.lat.astype(float), self.lon.astype(float)
+        # force 64 bit for coordinate transforms (no copy if already)
+        return self.lat.astype(np.float64, copy=False), \
+            self.lon.astype(np.float64, copy=False)
 
     def matchTypeFileName(self, matchTypeFile=None, myPath=None):
         '''
@@ -637,12 +692,14 @@ class offsets:
                     vrtFile=None):
         '''
         Read da/dr offset file at previously set up offset names, or specify
-        directly with values as defined for init.
+        directly with values as defined for init. Returns rgOff, azOff as
+        for getOffsets (call setValid after editing them).
         '''
         if vrtFile is not None:
             self.vrtFile = vrtFile
         if self.vrtFile is not None:
             self.readVrt({'RangeOffsets': 'rgOff', 'AzimuthOffsets': 'azOff'})
+            self.setValid()
             return
         # over ride names if needed.
         if len(self.azimuthFile) == 0 or rangeFile is not None \
@@ -662,16 +719,20 @@ class offsets:
                 print(f'Reading {self.rangeFile} of size {self.nr}x{self.na}')
             self.rgOff = readImage(self.rangeFile, self.nr, self.na, '>f4')
             self.rgOff[np.isnan(self.rgOff)] = -2.e9
+            self.setValid()
         else:
             myerror(f'Offsets tried to read offset files: '
                     f'{self.azimuthFile} {self.rangeFile}')
 
-        return self.rgOff.astype(float), self.azOff.astype(float)
+        return asFloat(self.rgOff), asFloat(self.azOff)
 
     def getOffsets(self, fileRoot=None, rangeFile=None, datFile=None,
                    vrtFile=None):
         '''
-        Return offsets values as float
+        Return offsets values as float (package precision, no copy if
+        already that type). The float32 default returns rgOff, azOff
+        themselves, so call setValid after editing them in place, or the
+        cached valid mask (areValid, nValid) will be out of date.
         '''
         if len(self.rgOff) <= 0:
             self.readOffsets(fileRoot, rangeFile, datFile, vrtFile=vrtFile)
@@ -679,8 +740,132 @@ class offsets:
         if len(self.rgOff) <= 0:
             print(' Could not read lat/lon - check files exist ')
             exit()
-            # force conversion to 64 bit for coordinate transforms
-        return self.rgOff.astype(float), self.azOff.astype(float)
+        return asFloat(self.rgOff), asFloat(self.azOff)
+
+    def layerVrtFile(self, layer):
+        '''
+        Return the vrt that holds layer, or None if it is read from a raw file
+        '''
+        if layer == 'mask':
+            return self.maskVrtFile
+        if layer == 'matchType':
+            return self.vrtMatchFile
+        if layer in ['lat', 'lon']:
+            if len(self.latFile) == 0:
+                return None
+            vrtFile = self.latFile.replace('.lat', '.ll.vrt')
+            return vrtFile if os.path.exists(vrtFile) else None
+        return self.vrtFile
+
+    def readLayer(self, layer, window=None):
+        '''
+        Read a single layer from its raw file and return it, optionally
+        only the ((a0, a1), (r0, r1)) window
+        '''
+        fileAttr, dataType, _ = offsetLayers[layer]
+        if layer == 'cc' and self.ccFile is None:
+            self.ccFileName()
+        fileName = getattr(self, fileAttr)
+        if fileName is None or len(fileName) == 0 or \
+                not os.path.exists(fileName):
+            myerror(f'offsets.readLayer: invalid file for {layer} - '
+                    f'{fileName}')
+        if self.verbose and window is None:
+            print(f'Reading {fileName} with size {self.nr}x{self.na}')
+        x = readImage(fileName, self.nr, self.na, dataType, window=window)
+        if layer in ['azOff', 'rgOff']:
+            x[np.isnan(x)] = -2.e9
+        return x
+
+    def readAll(self, layers=None, maxThreads=8):
+        '''
+        Read several layers (keys of offsetLayers, default azOff and rgOff)
+        concurrently on a thread pool. Layers that live in the same vrt are
+        read with a single open of that vrt.
+        '''
+        if layers is None:
+            layers = ['azOff', 'rgOff']
+        for layer in layers:
+            if layer not in offsetLayers:
+                myerror(f'offsets.readAll: invalid layer {layer} not in '
+                        f'{list(offsetLayers)}')
+        # sizes are needed before any raw reads start
+        if self.nr < 1 or self.na < 1:
+            self.readOffsetsDat()
+        # group vrt layers by file, the rest are read raw
+        vrtGroups, rawLayers = {}, []
+        for layer in layers:
+            vrtFile = self.layerVrtFile(layer)
+            if vrtFile is None:
+                rawLayers.append(layer)
+            else:
+                vrtGroups.setdefault(vrtFile, {})[offsetLayers[layer][2]] = \
+                    layer
+        #
+        with ThreadPoolExecutor(max_workers=maxThreads) as pool:
+            vrtJobs = [pool.submit(self.readVrt, bandTranslation,
+                                   vrtFile=vrtFile)
+                       for vrtFile, bandTranslation in vrtGroups.items()]
+            rawJobs = {layer: pool.submit(self.readLayer, layer)
+                       for layer in rawLayers}
+            for job in vrtJobs:
+                job.result()
+            for layer, job in rawJobs.items():
+                setattr(self, layer, job.result())
+        if len(self.azOff) > 0 and len(self.rgOff) > 0:
+            self.setValid()
+
+    def iterBlocks(self, nRows, layers=None, halo=0):
+        '''
+        Generator over blocks of nRows azimuth rows for out-of-core work.
+        Each step yields (origin, core, data, rCoord, aCoord) where origin is
+        the first azimuth row of the block (including halo), core is the
+        slice of block rows without the halo, data is a dict of layer
+        arrays and rCoord/aCoord are the slp coordinates for the block.
+        Layers are read from raw files or vrt windows.
+        '''
+        if layers is None:
+            layers = ['azOff', 'rgOff']
+        for layer in layers:
+            if layer not in offsetLayers:
+                myerror(f'offsets.iterBlocks: invalid layer {layer} not in '
+                        f'{list(offsetLayers)}')
+        if self.nr < 1 or self.na < 1:
+            self.readOffsetsDat()
+        rc = np.arange(0, self.nr, dtype=float) * self.dr + self.r0
+        with ExitStack() as stack:
+            # open each vrt once and map layers to bands
+            vrtOpen, vrtBands = {}, {}
+            for layer in layers:
+                vrtFile = self.layerVrtFile(layer)
+                if vrtFile is None:
+                    continue
+                if vrtFile not in vrtOpen:
+                    r = stack.enter_context(rasterio.open(vrtFile))
+                    vrtOpen[vrtFile] = (r, {r.tags(bidx=i)['Description']: i
+                                            for i in range(1, r.count + 1)})
+                r, allBands = vrtOpen[vrtFile]
+                if offsetLayers[layer][2] not in allBands:
+                    myerror(f'offsets.iterBlocks: Could not find band for '
+                            f'{layer} in {vrtFile}')
+                vrtBands[layer] = (r, allBands[offsetLayers[layer][2]])
+            #
+            for a0 in range(0, self.na, nRows):
+                a1 = min(a0 + nRows, self.na)
+                # extend by halo, clipped to the image
+                h0, h1 = max(a0 - halo, 0), min(a1 + halo, self.na)
+                window = ((h0, h1), (0, self.nr))
+                data = {}
+                for layer in layers:
+                    if layer in vrtBands:
+                        r, band = vrtBands[layer]
+                        data[layer] = r.read(band, window=window)
+                    else:
+                        data[layer] = self.readLayer(layer, window=window)
+                ac = np.arange(h0, h1, dtype=float) * self.da + self.a0
+                rCoord = np.broadcast_to(rc, (h1 - h0, self.nr))
+                aCoord = np.broadcast_to(ac[:, np.newaxis], (h1 - h0, self.nr))
+                yield h0, slice(a0 - h0, a1 - h0), data, rCoord, aCoord
 
     def removeList(self, toRemove):
         '''
@@ -702,6 +887,12 @@ class offsets:
         if len(noUse) > 0:
             rg[noUse] = -2.e9
             az[noUse] = -2.e9
+            # keep cached mask current
+            if self.validMask is not None and self.packValid:
+                np.bitwise_and.at(self.validMask, noUse >> 3,
+                                  ~(128 >> (noUse & 7)).astype(np.uint8))
+            elif self.validMask is not None:
+                self.validMask.reshape(-1)[noUse] = False
         # print('nremove = ', np.sum(noUse))
         # reshape
         self.rgOff = rg.reshape(shapeSave)
@@ -722,6 +913,11 @@ class offsets:
                         'offset set shape')
             self.rgOff[toRemove] = -2.e9
             self.azOff[toRemove] = -2.e9
+            # keep cached mask current
+            if self.validMask is not None and self.packValid:
+                self.validMask &= ~np.packbits(toRemove, axis=None)
+            elif self.validMask is not None:
+                self.validMask[toRemove] = False
         else:
             print('warning - no offsets remove because offsets not specified')
             return
@@ -962,27 +1158,23 @@ class offsets:
         '''
         return self.geodatrxa.isSouth()
 
-    def getRACoords(self):
+    def getRACoords(self, dense=False):
         '''
-        Compute single look pixel coordinates
+        Compute single look pixel coordinates. These are read-only
+        broadcast views of the 1-D axes, use dense=True for writable
+        (na, nr) arrays.
         '''
         if self.na < 1 or self.nr < 1:
             myerror('offsets.slpCoords: tried to define coordinate with no '
                     'size input - make sure .dat file read')
-        if len(self.rCoord) > 1:
-            return self.rCoord, self.aCoord
-
-        rc = np.arange(0, self.nr*self.dr, self.dr)+self.r0
-        ac = np.arange(0, self.na*self.da, self.da)+self.a0
-        self.rCoord = np.zeros((self.na, self.nr))
-        self.aCoord = np.zeros((self.na, self.nr))
-        # range coord
-        for i in range(0, self.nr):
-            self.aCoord[:, i] = ac.copy()
-        # azimuth coord
-        for i in range(0, self.na):
-            self.rCoord[i, :] = rc.copy()
-        # return
+        if len(self.rCoord) <= 1:
+            rc = np.arange(0, self.nr, dtype=float) * self.dr + self.r0
+            ac = np.arange(0, self.na, dtype=float) * self.da + self.a0
+            self.rCoord = np.broadcast_to(rc, (self.na, self.nr))
+            self.aCoord = np.broadcast_to(ac[:, np.newaxis],
+                                          (self.na, self.nr))
+        if dense:
+            return np.array(self.rCoord), np.array(self.aCoord)
         return self.rCoord, self.aCoord
 
     def slpRAtoOffsetCoords(self, r, a):
@@ -0,0 +1,59 @@
+# projCache.py
+import threading
+from collections import OrderedDict
+import pyproj
+
+# pyproj objects are expensive to create (projection database lookups) and
+# not safe to share between threads, so each thread keeps its own LRU cache
+# keyed by the CRS strings (EPSG code, proj string or wkt).
+projCacheSize = {'size': 64}
+projCache = threading.local()
+
+
+def threadCache():
+    """ return this thread's cache, creating it on first use """
+    cache = getattr(projCache, 'cache', None)
+    if cache is None:
+        cache = projCache.cache = OrderedDict()
+    return cache
+
+
+def cachedProj(key, create):
+    """ return the cached object for key, calling create() if it is new """
+    cache = threadCache()
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    value = create()
+    cache[key] = value
+    while len(cache) > projCacheSize['size']:
+        cache.popitem(last=False)
+    return value
+
+
+def getCRS(srs):
+    """ cached pyproj.CRS for srs """
+    return cachedProj(('crs', srs), lambda: pyproj.CRS(srs))
+
+
+def getProj(srs):
+    """ cached pyproj.Proj for srs """
+    return cachedProj(('proj', srs), lambda: pyproj.Proj(getCRS(srs)))
+
+
+def getTransformer(srsFrom, srsTo):
+    """ cached pyproj.Transformer from srsFrom to srsTo (same axis order as
+    Transformer.from_crs, e.g., lat, lon for EPSG:4326) """
+    return cachedProj(('transformer', srsFrom, srsTo),
+                      lambda: pyproj.Transformer.from_crs(getCRS(srsFrom),
+                                                          getCRS(srsTo)))
+
+
+def setProjCacheSize(size):
+    """ set the number of objects cached per thread """
+    projCacheSize['size'] = size
+
+
+def clearProjCache():
+    """ empty this thread's cache """
+    threadCache().clear()
@@ -1,10 +1,19 @@
 import numpy as np
 
 
-def readImage(fileName, nx, ny, dataType):
+def readImage(fileName, nx, ny, dataType, mmap=False, window=None,
+              decimation=1):
     """ read a binary image of size nx by ny with dataType = to one
     ['f4','>f4','>u2','u2','>i2','i2','>u4','u4','>i4','i4','u1','>f8','f8']
-    if f4 variant, conver to float for internal use   """
+    if f4 variant, conver to float for internal use
+    mmap=True returns a read-only np.memmap with the file's byte order
+    preserved, so nothing is read until pixels are touched. Slices convert
+    to native order in arithmetic or with nativeBlock(x[r0:r1]).
+    window=((r0, r1), (c0, c1)) reads only rows r0:r1 and columns c0:c1,
+    seeking directly to the first row (windows under half the width are
+    copied from a memmap, so only the pages they touch are read).
+    decimation=k returns every kth row and column, starting k//2 into the
+    window, by striding a memmap so only the sampled rows are read."""
 #
 # reads several types of binary images and creates a numpy matrix
 #
@@ -16,11 +25,41 @@ def readImage(fileName, nx, ny, dataType):
         exit()
 
     dt = np.dtype(dataType)
-    x = np.fromfile(fileName, dtype=dt)[0:nx*ny]
-    x = np.reshape(x, [ny, nx])
+    if window is None:
+        window = ((0, ny), (0, nx))
+    (r0, r1), (c0, c1) = window
+    if decimation > 1:
+        x = np.memmap(fileName, dtype=dt, mode='r', shape=(ny, nx))
+        h = decimation // 2
+        x = x[r0 + h:r1:decimation, c0 + h:c1:decimation]
+        if mmap:
+            return x
+        return np.ascontiguousarray(nativeBlock(x))
+    if mmap:
+        # zero copy - byte order conversion deferred to block access
+        x = np.memmap(fileName, dtype=dt, mode='r', shape=(ny, nx))
+        return x[r0:r1, c0:c1]
+    if c1 - c0 < nx // 2:
+        # narrow window - copy just the cutout so I/O scales with its size
+        x = np.memmap(fileName, dtype=dt, mode='r', shape=(ny, nx))
+        return np.array(x[r0:r1, c0:c1], dtype=dt.newbyteorder('='))
+    # seek to first row and read only the rows in the window
+    x = np.fromfile(fileName, dtype=dt, count=(r1 - r0) * nx,
+                    offset=r0 * nx * dt.itemsize)
+    x = np.reshape(x, [r1 - r0, nx])[:, c0:c1]
     # print('Data Type ',dataType)
     # swap data so its in native format
     if '>' in dataType:
         x = x.astype(np.dtype(dataType.replace('>', '')))
+    elif c1 - c0 < nx:
+        x = np.ascontiguousarray(x)
     # print(x.dtype)
     return x
+
+
+def nativeBlock(x):
+    """ return block x (e.g., a slice of a memmapped image) in native byte
+    order, only copying if a swap is needed """
+    if x.dtype.isnative:
+        return np.asarray(x)
+    return x.astype(x.dtype.newbyteorder('='))
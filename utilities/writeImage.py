@@ -1,9 +1,13 @@
+import numpy as np
 from utilities import myerror
 
 
-def writeImage(fileName, x, dataType):
+def writeImage(fileName, x, dataType, blockSize=4 * 1024 * 1024):
     """ write a binary image of size nx by ny with dataType = to one
-    ['f4','>f4','>u2','u2','>i2','i2','>u4','u4','>i4','i4','u1'] """
+    ['f4','>f4','>u2','u2','>i2','i2','>u4','u4','>i4','i4','u1']
+    x can be an array or an iterator of row blocks, so producers can stream
+    output. Rows are converted (and byte swapped) into a reusable scratch
+    buffer of ~blockSize bytes and written, so x is never copied whole."""
 #
 # reads several types of binary images and creates a numpy matrix
 #
@@ -11,15 +15,26 @@ def writeImage(fileName, x, dataType):
              '>i4', 'i4', 'u1']
     if dataType not in types:
         myerror(f'writeImage: invalid data type - {dataType}')
-
-    x1 = x
-    types = {'f4': 'float32', 'f8': 'float64', 'i2': 'int16', 'i4': 'int32',
-             'u1': 'uint8', 'u2': 'uint16', 'u4': 'uint32'}
-    x1 = x1.astype(types[dataType.replace('>', '')])
-    if '>' in dataType:
-        x1.byteswap(True)
-
-    fOut = open(fileName, 'w')
-    x1.tofile(fOut)
-    fOut.close()
+    dt = np.dtype(dataType)
+    #
+    # split arrays into row blocks, otherwise assume an iterator of blocks
+    if isinstance(x, np.ndarray):
+        # 1-D arrays are split by element count (one element rows)
+        x2 = x.reshape(x.shape[0], -1) if x.ndim > 0 else x.reshape(1, 1)
+        blockRows = max(blockSize // max(x2.shape[1] * dt.itemsize, 1), 1)
+        blocks = (x2[i:i + blockRows] for i in range(0, x2.shape[0],
+                                                       blockRows))
+    else:
+        blocks = x
+    #
+    scratch = np.empty(0, dtype=dt)
+    with open(fileName, 'wb') as fOut:
+        for block in blocks:
+            block = np.asarray(block)
+            if block.size > scratch.size:
+                scratch = np.empty(block.size, dtype=dt)
+            # copy converts type and byte order in one pass
+            out = scratch[0:block.size].reshape(block.shape)
+            np.copyto(out, block, casting='unsafe')
+            out.tofile(fOut)
     return